@@ -0,0 +1,166 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many concurrent chat runs ({reason} limit reached)")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class Permit:
+    """One admitted chat run; releasing it more than once is a no-op."""
+
+    def __init__(
+        self, controller: "AdmissionController", user_id: str, session_id: str
+    ):
+        self.controller = controller
+        self.user_id = user_id
+        self.session_id = session_id
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller.release(self)
+
+
+class AdmissionController:
+    """
+    Caps concurrent model runs per session, per user and globally.
+
+    A busy session queues up to `session_queue_size` callers for at most `queue_timeout` seconds; the slot is handed
+    over directly to the oldest waiter. Per-user and global limits reject immediately. `observe` receives each decision,
+    its reason and the time spent queued.
+    """
+
+    def __init__(
+        self,
+        max_per_session: int,
+        session_queue_size: int,
+        queue_timeout: float,
+        max_per_user: int,
+        max_global: int,
+        retry_after: float,
+        observe: Optional[Callable[[str, str, float], None]] = None,
+    ):
+        self.max_per_session = max_per_session
+        self.session_queue_size = session_queue_size
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max_per_user
+        self.max_global = max_global
+        self.retry_after = retry_after
+        self.observe = observe
+
+        self.sessions: Dict[str, int] = {}
+        self.users: Dict[str, int] = {}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self.active = 0
+
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"session": 0, "user": 0, "global": 0}
+
+    def decide(self, decision: str, reason: str, started: float) -> None:
+        if decision == "admitted":
+            self.admitted += 1
+        else:
+            self.rejected[reason] += 1
+
+        if self.observe:
+            self.observe(decision, reason, time.perf_counter() - started)
+
+    def reject(self, reason: str, started: float) -> AdmissionRejected:
+        self.decide("rejected", reason, started)
+        return AdmissionRejected(reason, self.retry_after)
+
+    async def acquire(self, user_id: str, session_id: str) -> Permit:
+        started = time.perf_counter()
+        queued = False
+
+        if self.sessions.get(session_id, 0) >= self.max_per_session:
+            if len(self.waiters.get(session_id, ())) >= self.session_queue_size:
+                raise self.reject("session", started)
+
+            waiters = self.waiters.setdefault(session_id, deque())
+
+            waiter = asyncio.get_running_loop().create_future()
+            waiters.append(waiter)
+            queued = True
+
+            try:
+                await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+            except BaseException as e:
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters and self.waiters.get(session_id) is waiters:
+                        del self.waiters[session_id]
+                # Handed the slot just as the wait ended; pass it on
+                elif waiter.done() and not waiter.cancelled():
+                    self.release_session(session_id)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self.reject("session", started) from None
+                raise
+        else:
+            self.sessions[session_id] = self.sessions.get(session_id, 0) + 1
+
+        reason = None
+        if self.users.get(user_id, 0) >= self.max_per_user:
+            reason = "user"
+        elif self.active >= self.max_global:
+            reason = "global"
+
+        if reason is not None:
+            self.release_session(session_id)
+            raise self.reject(reason, started)
+
+        self.users[user_id] = self.users.get(user_id, 0) + 1
+        self.active += 1
+        self.decide("admitted", "queued" if queued else "immediate", started)
+
+        return Permit(self, user_id, session_id)
+
+    def release_session(self, session_id: str) -> None:
+        waiters = self.waiters.get(session_id)
+
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.waiters.pop(session_id, None)
+
+        count = self.sessions.get(session_id, 0) - 1
+        if count > 0:
+            self.sessions[session_id] = count
+        else:
+            self.sessions.pop(session_id, None)
+
+    def release(self, permit: Permit) -> None:
+        count = self.users.get(permit.user_id, 0) - 1
+        if count > 0:
+            self.users[permit.user_id] = count
+        else:
+            self.users.pop(permit.user_id, None)
+
+        self.active -= 1
+        self.release_session(permit.session_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "activeRuns": self.active,
+            "activeSessions": len(self.sessions),
+            "queuedRequests": sum(len(waiters) for waiters in self.waiters.values()),
+            "admitted": self.admitted,
+            "rejectedSession": self.rejected["session"],
+            "rejectedUser": self.rejected["user"],
+            "rejectedGlobal": self.rejected["global"],
+        }
@@ -0,0 +1,97 @@
+import copy
+import datetime
+import hashlib
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def normalize_message(message: str) -> str:
+    message = re.sub(r"\s+", " ", message.lower()).strip()
+    return message.rstrip(".!?")
+
+
+def synthesize_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of cached advisor events with fresh ids and timestamps, shaped like a live stream."""
+    invocation_id = f"e-{uuid.uuid4()}"
+    timestamp = datetime.datetime.now(tz=datetime.timezone.utc).timestamp()
+
+    synthesized = []
+    for event in events:
+        event = copy.deepcopy(event)
+        if "id" in event:
+            event["id"] = str(uuid.uuid4())
+        if "invocation_id" in event:
+            event["invocation_id"] = invocation_id
+        if "timestamp" in event:
+            event["timestamp"] = timestamp
+        synthesized.append(event)
+
+    return synthesized
+
+
+class AdvisorCache:
+    """
+    TTL + LRU cache of complete advisor streams.
+
+    Keys combine the advisor engine version, the configured prompt version and the normalized user message, so a
+    redeploy or prompt change never serves stale answers.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, prompt_version: str):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prompt_version = prompt_version
+        self.entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, engine_version: str, message: str) -> str:
+        raw = "\0".join(
+            (engine_version, self.prompt_version, normalize_message(message))
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self.entries.get(key)
+
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, events: List[Dict[str, Any]]) -> None:
+        if self.max_entries <= 0 or not events:
+            return
+
+        self.entries[key] = (time.monotonic() + self.ttl, events)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
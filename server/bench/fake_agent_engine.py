@@ -0,0 +1,391 @@
+import asyncio
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+@dataclass
+class FakeLatency:
+    """Simulated Agent Engine latencies, in seconds. Every value gets +/- `jitter` relative noise."""
+
+    sessions_create: float = 0.25
+    sessions_list: float = 0.15
+    sessions_delete: float = 0.1
+    sessions_update: float = 0.1
+    events_append: float = 0.12
+    events_list: float = 0.15
+    engines_get: float = 0.2
+    stream_first_event: float = 1.5
+    stream_event_interval: float = 0.4
+    stream_events: int = 4
+    advisor_first_event: float = 0.6
+    jitter: float = 0.2
+
+    def sample(self, seconds: float) -> float:
+        return max(0.0, seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+PRODUCTS = [
+    {
+        "product_id": f"gid://shopify/Product/{1000 + i}",
+        "title": title,
+        "description": f"{title} printed on heavyweight cotton. " * 8,
+        "url": f"https://example.myshopify.com/products/{title.lower().replace(' ', '-')}",
+        "image_url": f"https://cdn.example.com/{1000 + i}.jpg",
+        "price_range": {"min": "29.00", "max": "39.00", "currency": "CAD"},
+        "product_type": "T-Shirt",
+        "tags": ["graphic", "cotton"],
+        "variants": [
+            {
+                "variant_id": f"gid://shopify/ProductVariant/{5000 + i * 10 + j}",
+                "title": f"{size} / {color}",
+                "price": "29.00",
+                "available": True,
+            }
+            for j, (size, color) in enumerate(
+                (s, c) for s in ("S", "M", "L", "XL") for c in ("Black", "White")
+            )
+        ],
+    }
+    for i, title in enumerate(
+        ("Retro Wave Tee", "Mountain Line Tee", "Night City Hoodie", "Sunset Crewneck")
+    )
+]
+
+
+def session_id_of(name: str) -> str:
+    return name.split("/sessions/")[1].split("/")[0]
+
+
+class FakeStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+
+    def create(
+        self,
+        engine: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]],
+        display_name: Optional[str],
+    ) -> str:
+        session_id = str(random.randint(10**17, 10**18))
+        with self.lock:
+            self.sessions[session_id] = {
+                "engine": engine,
+                "user_id": user_id,
+                "display_name": display_name,
+                "state": dict(state or {}),
+                "events": [],
+                "created_at": time.time(),
+            }
+        return session_id
+
+    def append(self, session_id: str, event: SimpleNamespace) -> None:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise RuntimeError(f"Session {session_id} not found")
+            session["events"].append(event)
+
+
+class FakeSessionEvents:
+    def __init__(self, store: FakeStore, latency: FakeLatency):
+        self.store = store
+        self.latency = latency
+
+    def append(
+        self,
+        name: str,
+        author: str,
+        invocation_id: str,
+        timestamp: datetime.datetime,
+        config: Any = None,
+    ) -> None:
+        time.sleep(self.latency.sample(self.latency.events_append))
+
+        content = getattr(config, "content", None) or (
+            config.get("content") if isinstance(config, dict) else None
+        )
+        actions = getattr(config, "actions", None)
+
+        self.store.append(
+            session_id_of(name),
+            make_event(
+                name,
+                author,
+                timestamp,
+                content,
+                getattr(actions, "state_delta", None),
+            ),
+        )
+
+    def list(self, name: str, config: Any = None) -> List[SimpleNamespace]:
+        time.sleep(self.latency.sample(self.latency.events_list))
+
+        with self.store.lock:
+            session = self.store.sessions.get(session_id_of(name))
+            events = list(session["events"]) if session else []
+
+        match = re.search(r'timestamp>="([^"]+)"', (config or {}).get("filter", ""))
+        if match:
+            after = datetime.datetime.fromisoformat(
+                match.group(1).replace("Z", "+00:00")
+            )
+            events = [event for event in events if event.timestamp >= after]
+
+        return events
+
+
+class FakeSessions:
+    def __init__(self, store: FakeStore, latency: FakeLatency):
+        self.store = store
+        self.latency = latency
+        self.events = FakeSessionEvents(store, latency)
+
+    def create(self, name: str, user_id: str, config: Any = None) -> Any:
+        time.sleep(self.latency.sample(self.latency.sessions_create))
+
+        config = config if isinstance(config, dict) else {}
+        session_id = self.store.create(
+            name, user_id, config.get("session_state"), config.get("display_name")
+        )
+        return SimpleNamespace(
+            response=SimpleNamespace(name=f"{name}/sessions/{session_id}")
+        )
+
+    def list(self, name: str, config: Any = None) -> List[Any]:
+        time.sleep(self.latency.sample(self.latency.sessions_list))
+
+        user_id = (config or {}).get("filter", "").partition("user_id=")[2]
+
+        with self.store.lock:
+            sessions = sorted(
+                (
+                    (session["created_at"], session_id, session["display_name"])
+                    for session_id, session in self.store.sessions.items()
+                    if session["engine"] == name and session["user_id"] == user_id
+                ),
+                reverse=True,
+            )
+
+        return [
+            SimpleNamespace(
+                name=f"{name}/sessions/{session_id}", display_name=display_name
+            )
+            for _, session_id, display_name in sessions
+        ]
+
+    def update(self, name: str, config: Any = None) -> None:
+        time.sleep(self.latency.sample(self.latency.sessions_update))
+
+        with self.store.lock:
+            session = self.store.sessions.get(session_id_of(name))
+            if session is None:
+                raise RuntimeError(f"Session {session_id_of(name)} not found")
+            session["display_name"] = (config or {}).get("display_name") or None
+
+    def delete(self, name: str) -> None:
+        time.sleep(self.latency.sample(self.latency.sessions_delete))
+
+        with self.store.lock:
+            self.store.sessions.pop(session_id_of(name), None)
+
+
+def make_event(
+    session_name: str,
+    author: str,
+    timestamp: datetime.datetime,
+    content: Optional[Dict[str, Any]],
+    state_delta: Optional[Dict[str, Any]] = None,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        name=f"{session_name}/events/{uuid.uuid4().hex}",
+        author=author,
+        timestamp=timestamp,
+        content=SimpleNamespace(
+            role=(content or {}).get("role"),
+            parts=[
+                SimpleNamespace(text=part.get("text"))
+                for part in (content or {}).get("parts", [])
+            ],
+        ),
+        actions=SimpleNamespace(state_delta=state_delta),
+    )
+
+
+class FakeAgentEngine:
+    def __init__(
+        self, name: str, store: FakeStore, latency: FakeLatency, advisor: bool
+    ):
+        self.name = name
+        self.store = store
+        self.latency = latency
+        self.advisor = advisor
+        self.api_resource = SimpleNamespace(update_time="2025-01-01T00:00:00Z")
+
+    async def async_stream_query(
+        self, user_id: str, session_id: str, message: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        session_name = f"{self.name}/sessions/{session_id}"
+        invocation_id = f"e-{uuid.uuid4()}"
+        now = lambda: datetime.datetime.now(tz=datetime.timezone.utc)
+
+        self.store.append(
+            session_id,
+            make_event(
+                session_name,
+                "user",
+                now(),
+                {"role": "user", "parts": [{"text": message}]},
+            ),
+        )
+
+        if self.advisor:
+            await asyncio.sleep(self.latency.sample(self.latency.advisor_first_event))
+            output = json.dumps(
+                {
+                    "message": "This tee runs true to size and pairs well with our hoodies.",
+                    "suggestions": ["Show me sizes", "What colors are there?"],
+                }
+            )
+            events = [self.event(invocation_id, "shopify_advisor", [{"text": output}])]
+        else:
+            await asyncio.sleep(self.latency.sample(self.latency.stream_first_event))
+            events = self.agent_events(invocation_id)
+
+        for i, event in enumerate(events):
+            if i:
+                await asyncio.sleep(
+                    self.latency.sample(self.latency.stream_event_interval)
+                )
+
+            text_parts = [p for p in event["content"]["parts"] if "text" in p]
+            if text_parts:
+                self.store.append(
+                    session_id,
+                    make_event(session_name, event["author"], now(), event["content"]),
+                )
+
+            yield event
+
+    def agent_events(self, invocation_id: str) -> List[Dict[str, Any]]:
+        output = {
+            "message": "Here are a few tees you might like.",
+            "productComponent": {"items": [p["title"] for p in PRODUCTS[:3]]},
+            "tableComponent": None,
+            "suggestions": {"type": "default", "payload": ["Show more", "Compare"]},
+        }
+
+        events = [
+            self.event(
+                invocation_id,
+                "shopify_agent",
+                [
+                    {
+                        "function_call": {
+                            "name": "search_shop_catalog",
+                            "args": {"query": "tee", "context": "graphic tees"},
+                        }
+                    }
+                ],
+            ),
+            self.event(
+                invocation_id,
+                "shopify_agent",
+                [
+                    {
+                        "function_response": {
+                            "name": "search_shop_catalog",
+                            "response": {
+                                "content": [
+                                    {
+                                        "type": "text",
+                                        "text": json.dumps({"products": PRODUCTS}),
+                                    }
+                                ]
+                            },
+                        }
+                    }
+                ],
+            ),
+        ]
+
+        # Pad with extra tool round trips to reach the configured event count
+        while len(events) < self.latency.stream_events - 1:
+            events.append(
+                self.event(
+                    invocation_id,
+                    "shopify_agent",
+                    [{"function_call": {"name": "get_cached_products", "args": {}}}],
+                )
+            )
+
+        events.append(
+            self.event(
+                invocation_id,
+                "shopify_agent",
+                [{"function_call": {"name": "set_model_response", "args": output}}],
+            )
+        )
+        return events
+
+    def event(
+        self, invocation_id: str, author: str, parts: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        return {
+            "content": {"parts": parts, "role": "model"},
+            "invocation_id": invocation_id,
+            "author": author,
+            "actions": {"state_delta": {}, "artifact_delta": {}},
+            "id": str(uuid.uuid4()),
+            "timestamp": time.time(),
+        }
+
+
+class FakeAgentEngines:
+    def __init__(self, latency: FakeLatency, advisor_resource_id: Optional[str]):
+        self.latency = latency
+        self.advisor_resource_id = advisor_resource_id
+        self.store = FakeStore()
+        self.sessions = FakeSessions(self.store, latency)
+
+    def get(self, name: str) -> FakeAgentEngine:
+        time.sleep(self.latency.sample(self.latency.engines_get))
+        resource_id = name.rstrip("/").rsplit("/", 1)[-1]
+        return FakeAgentEngine(
+            name,
+            self.store,
+            self.latency,
+            advisor=resource_id == self.advisor_resource_id,
+        )
+
+
+class FakeClient:
+    """In-process stand-in for `vertexai.Client`, covering the Agent Engine surface the server uses."""
+
+    latency = FakeLatency()
+    advisor_resource_id: Optional[str] = None
+
+    def __init__(self, project: Optional[str] = None, location: Optional[str] = None):
+        self.agent_engines = FakeAgentEngines(self.latency, self.advisor_resource_id)
+
+
+def install(latency: FakeLatency, advisor_resource_id: Optional[str]) -> None:
+    """
+    Replaces `vertexai.Client` with `FakeClient`; call before importing the server.
+
+    The engine whose resource id is `advisor_resource_id` answers like the advisor, every other one like the agent.
+    """
+    import vertexai
+
+    FakeClient.latency = latency
+    FakeClient.advisor_resource_id = advisor_resource_id
+    vertexai.Client = FakeClient
@@ -0,0 +1,395 @@
+"""
+Offline load test for the server.
+
+Starts the server against a fake Agent Engine (see `bench/fake_agent_engine.py`) and replays widget flows from many
+concurrent shoppers, then reports throughput, p50/p95/p99 latency and time-to-first-event per route.
+
+    cd server
+    uv run python -m bench.loadtest --shoppers 200 --concurrency 50
+    uv run python -m bench.loadtest --url http://127.0.0.1:8000  # against an already running server
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.fake_agent_engine import FakeLatency
+from bench.serve import add_latency_arguments, latency_from_args
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADVISOR_PROMPTS = [
+    "I am on the products catalog page.",
+    "I am on the product page for Retro Wave Tee.",
+    "I am on the cart page.",
+]
+
+AGENT_PROMPTS = [
+    "Show me graphic tees",
+    "Do you have this in a medium?",
+    "Add the black one to my cart",
+    "What is in my cart?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_events: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(
+        self,
+        route: str,
+        latency: float,
+        ok: bool,
+        first_event: Optional[float] = None,
+    ) -> None:
+        self.latencies[route].append(latency)
+
+        if first_event is not None:
+            self.first_events[route].append(first_event)
+        if not ok:
+            self.errors[route] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        routes = {}
+
+        for route, latencies in sorted(self.latencies.items()):
+            first_events = self.first_events.get(route, [])
+
+            routes[route] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(route, 0),
+                "throughput": len(latencies) / elapsed,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "ttfeP50": percentile(first_events, 50) if first_events else None,
+                "ttfeP95": percentile(first_events, 95) if first_events else None,
+                "ttfeP99": percentile(first_events, 99) if first_events else None,
+            }
+
+        requests = sum(route["requests"] for route in routes.values())
+
+        return {
+            "elapsedSeconds": elapsed,
+            "requests": requests,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "throughput": requests / elapsed,
+            "routes": routes,
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    ms = lambda value: "-" if value is None else f"{value * 1000:.0f}"
+
+    header = (
+        f"{'route':<36}{'reqs':>7}{'errs':>6}{'req/s':>8}"
+        f"{'p50':>8}{'p95':>8}{'p99':>8}{'ttfe50':>8}{'ttfe95':>8}{'ttfe99':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    for route, stats in report["routes"].items():
+        print(
+            f"{route:<36}{stats['requests']:>7}{stats['errors']:>6}{stats['throughput']:>8.1f}"
+            f"{ms(stats['p50']):>8}{ms(stats['p95']):>8}{ms(stats['p99']):>8}"
+            f"{ms(stats['ttfeP50']):>8}{ms(stats['ttfeP95']):>8}{ms(stats['ttfeP99']):>8}"
+        )
+
+    print("-" * len(header))
+    print(
+        f"{report['requests']} requests, {report['errors']} errors in "
+        f"{report['elapsedSeconds']:.1f}s ({report['throughput']:.1f} req/s); latencies in ms"
+    )
+
+
+class Shopper:
+    """Replays the requests the widget makes for one visitor."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        profile: str,
+        agent_turns: int,
+    ):
+        self.client = client
+        self.recorder = recorder
+        self.profile = profile
+        self.agent_turns = agent_turns
+        self.user_id = f"bench-{uuid.uuid4().hex[:12]}"
+
+    async def request(self, route: str, method: str, url: str, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+
+        self.recorder.record(route, time.perf_counter() - started, ok)
+
+        if not ok or response.status_code == 304:
+            return None
+        return response.json().get("data")
+
+    async def stream(self, route: str, url: str, message: str) -> None:
+        started = time.perf_counter()
+        first_event = None
+        ok = False
+
+        try:
+            async with self.client.stream(
+                "POST",
+                url,
+                params={"profile": self.profile},
+                json={"message": message},
+            ) as response:
+                ok = response.status_code < 400
+
+                async for line in response.aiter_lines():
+                    if first_event is None and line.startswith(("data:", "event:")):
+                        first_event = time.perf_counter() - started
+        except httpx.HTTPError:
+            ok = False
+
+        self.recorder.record(route, time.perf_counter() - started, ok, first_event)
+
+    async def first_visit(self) -> None:
+        user_id = self.user_id
+
+        data = await self.request(
+            "latest-advisor-session",
+            "GET",
+            f"/api/chat/{user_id}/latest-advisor-session",
+        )
+        if data is None:
+            return
+
+        data = await self.request(
+            "create-advisor-session",
+            "POST",
+            f"/api/chat/{user_id}/create-advisor-session",
+        )
+        if data is None:
+            return
+        advisor_session_id = data["sessionId"]
+
+        data = await self.request(
+            "latest-agent-session", "GET", f"/api/chat/{user_id}/latest-agent-session"
+        )
+        if data is None:
+            return
+
+        data = await self.request(
+            "create-agent-session",
+            "POST",
+            f"/api/chat/{user_id}/create-agent-session",
+            json={"cart_id": uuid.uuid4().hex},
+        )
+        if data is None:
+            return
+        agent_session_id = data["sessionId"]
+
+        await self.request(
+            "inject-agent-message",
+            "POST",
+            f"/api/chat/{agent_session_id}/inject-agent-message",
+            json={"message": "Hi! How can I help you today?"},
+        )
+
+        await self.stream(
+            "send-advisor-message",
+            f"/api/chat/{user_id}/{advisor_session_id}/send-advisor-message",
+            random.choice(ADVISOR_PROMPTS),
+        )
+
+        await self.request(
+            "inject-agent-message-from-advisor",
+            "POST",
+            f"/api/chat/{agent_session_id}/inject-agent-message-from-advisor",
+            json={
+                "message": "This tee runs true to size.",
+                "suggestions": ["Show me sizes"],
+            },
+        )
+
+        await self.agent_turns_for(agent_session_id)
+
+    async def return_visit(self) -> None:
+        user_id = self.user_id
+
+        await self.request(
+            "latest-advisor-session",
+            "GET",
+            f"/api/chat/{user_id}/latest-advisor-session",
+        )
+
+        data = await self.request(
+            "latest-agent-session", "GET", f"/api/chat/{user_id}/latest-agent-session"
+        )
+        agent_session_id = data and data["latestSessionId"]
+        if agent_session_id is None:
+            return
+
+        await self.request(
+            "agent-history", "GET", f"/api/chat/{agent_session_id}/agent-history"
+        )
+
+        await self.agent_turns_for(agent_session_id)
+
+    async def agent_turns_for(self, agent_session_id: str) -> None:
+        for _ in range(self.agent_turns):
+            await self.stream(
+                "send-agent-message",
+                f"/api/chat/{self.user_id}/{agent_session_id}/send-agent-message",
+                random.choice(AGENT_PROMPTS),
+            )
+
+            await self.request(
+                "agent-history", "GET", f"/api/chat/{agent_session_id}/agent-history"
+            )
+
+
+async def run(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.request_timeout)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+
+        async def visit() -> None:
+            async with semaphore:
+                shopper = Shopper(client, recorder, args.profile, args.agent_turns)
+                await shopper.first_visit()
+
+                if random.random() < args.returning_ratio:
+                    await shopper.return_visit()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(visit() for _ in range(args.shoppers)))
+        elapsed = time.perf_counter() - started
+
+    return recorder.report(elapsed)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(latency: FakeLatency) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+
+    env = {
+        **os.environ,
+        "PROJECT_ID": "bench-project",
+        "LOCATION": "us-central1",
+        "RESOURCE_ID_AGENT": "1000",
+        "RESOURCE_ID_ADVISOR": "2000",
+        "SESSION_INDEX_PATH": os.path.join(tempfile.mkdtemp(), "sessions.db"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", "--port", str(port)]
+        + [
+            f"--{f.name.replace('_', '-')}={getattr(latency, f.name)}"
+            for f in dataclasses.fields(latency)
+        ],
+        cwd=SERVER_DIR,
+        env=env,
+    )
+
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while True:
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {base_url} not ready after {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replays widget flows against the server and reports per-route latency."
+    )
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--shoppers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--agent-turns", type=int, default=2)
+    parser.add_argument("--returning-ratio", type=float, default=0.3)
+    parser.add_argument("--profile", default="ui", choices=("full", "ui", "final-only"))
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="Also write the report as JSON to this path")
+
+    latency = parser.add_argument_group("fake Agent Engine latency (seconds)")
+    add_latency_arguments(latency)
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    process = None
+    base_url = args.url
+
+    if base_url is None:
+        process, base_url = start_server(latency_from_args(args))
+
+    try:
+        asyncio.run(wait_until_ready(base_url, timeout=30))
+        report = asyncio.run(run(args, base_url))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
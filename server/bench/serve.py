@@ -0,0 +1,44 @@
+import argparse
+import dataclasses
+import os
+
+import uvicorn
+
+from bench.fake_agent_engine import FakeLatency, install
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser) -> None:
+    for latency_field in dataclasses.fields(FakeLatency):
+        parser.add_argument(
+            f"--{latency_field.name.replace('_', '-')}",
+            type=latency_field.type if isinstance(latency_field.type, type) else float,
+            default=latency_field.default,
+            help=f"Fake Agent Engine {latency_field.name} (default: %(default)s)",
+        )
+
+
+def latency_from_args(args: argparse.Namespace) -> FakeLatency:
+    return FakeLatency(
+        **{f.name: getattr(args, f.name) for f in dataclasses.fields(FakeLatency)}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs the server against an in-process fake Agent Engine."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    install(latency_from_args(args), os.getenv("RESOURCE_ID_ADVISOR"))
+
+    # Imported after the fake is installed so the server builds its client from it
+    import main as server
+
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
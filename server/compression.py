@@ -0,0 +1,178 @@
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/event-stream")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Picks br or gzip from an Accept-Encoding header, honouring q-values; None means identity."""
+    accepted: Dict[str, float] = {}
+
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [name for name in candidates if accepted.get(name, 0) > 0]
+
+    if not candidates:
+        return None
+    return max(candidates, key=lambda name: accepted[name])
+
+
+class Encoder:
+    """Incremental encoder whose every `encode` call returns independently decodable output (a flushed block)."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=brotli_quality)
+            self.process = self.compressor.process
+            self.sync = self.compressor.flush
+            self.end = self.compressor.finish
+        else:
+            self.compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self.process = self.compressor.compress
+            self.sync = lambda: self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.end = lambda: self.compressor.flush(zlib.Z_FINISH)
+
+    def encode(self, data: bytes, final: bool = False) -> bytes:
+        return self.process(data) + (self.end() if final else self.sync())
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing JSON responses and SSE streams with br or gzip, as negotiated.
+
+    JSON bodies under `minimum_size` bytes are sent as is. SSE streams are compressed frame by frame, each frame
+    flushed as it is sent so the client can decode it immediately. `observe` receives the route, the encoding, and the
+    bytes before and after compression.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        compress_streams: bool = True,
+        observe: Optional[Callable[[str, str, int, int], None]] = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.compress_streams = compress_streams
+        self.observe = observe
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state: Dict[str, Any] = {"start": None, "encoder": None, "raw": 0, "sent": 0}
+
+        def report() -> None:
+            if self.observe and state["raw"]:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                self.observe(route, encoding, state["raw"], state["sent"])
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = message.get("headers", [])
+                content_type = header_value(response_headers, b"content-type")
+                already_encoded = header_value(response_headers, b"content-encoding")
+
+                is_stream = content_type.startswith("text/event-stream")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES) and (
+                    self.compress_streams or not is_stream
+                )
+
+                if already_encoded or not compressible:
+                    state["start"] = False
+                    await send(message)
+                    return
+
+                # Held until the first body chunk shows whether compressing pays off
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or not state["start"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+
+            if state["encoder"] is None:
+                if not more_body and len(body) < self.minimum_size:
+                    state["start"] = False
+                    await send(start)
+                    await send(message)
+                    return
+
+                state["encoder"] = Encoder(
+                    encoding, self.gzip_level, self.brotli_quality
+                )
+                start["headers"] = encoded_headers(start.get("headers", []), encoding)
+                await send(start)
+
+            compressed = state["encoder"].encode(body, final=not more_body)
+            state["raw"] += len(body)
+            state["sent"] += len(compressed)
+
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": compressed,
+                    "more_body": more_body,
+                }
+            )
+
+        try:
+            await self.app(scope, receive, send_compressed)
+        finally:
+            report()
+
+
+def header_value(headers: List[Tuple[bytes, bytes]], name: bytes) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1").lower()
+    return ""
+
+
+def encoded_headers(
+    headers: List[Tuple[bytes, bytes]], encoding: str
+) -> List[Tuple[bytes, bytes]]:
+    headers = [
+        (key, value) for key, value in headers if key.lower() != b"content-length"
+    ]
+
+    vary = header_value(headers, b"vary")
+    headers = [(key, value) for key, value in headers if key.lower() != b"vary"]
+    headers.append(
+        (b"vary", f"{vary}, Accept-Encoding".encode() if vary else b"Accept-Encoding")
+    )
+    headers.append((b"content-encoding", encoding.encode()))
+
+    return headers
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import Any, Callable, Awaitable, Dict, List, Optional
+
+import log
+
+
+class EngineRegistry:
+    """
+    Resolves Agent Engine application handles once and shares them across requests.
+
+    Handles are resolved by `warm`, refreshed in the background every `ttl` seconds, and rebuilt on demand after `invalidate`.
+    Each handle carries a version (e.g. its deployment update time); `on_version_change` callbacks fire when it changes.
+    """
+
+    def __init__(
+        self,
+        resolve: Callable[[str], Awaitable[Any]],
+        engine_names: List[str],
+        ttl: float,
+        version_of: Callable[[Any], str] = lambda handle: "",
+    ):
+        self.resolve = resolve
+        self.engine_names = engine_names
+        self.ttl = ttl
+        self.version_of = version_of
+        self.handles: Dict[str, Any] = {}
+        self.resolved_at: Dict[str, float] = {}
+        self.versions: Dict[str, str] = {}
+        self.on_version_change: List[Callable[[str], None]] = []
+        self.locks: Dict[str, asyncio.Lock] = {
+            name: asyncio.Lock() for name in engine_names
+        }
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    async def warm(self) -> None:
+        """Resolves every handle that is not resolved yet; raises the first failure."""
+        results = await asyncio.gather(
+            *(self.get(name) for name in self.engine_names),
+            return_exceptions=True,
+        )
+
+        for name, result in zip(self.engine_names, results):
+            if isinstance(result, Exception):
+                log.error("Failed to resolve engine", engine=name, error=str(result))
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    def start(self) -> None:
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self.refresh_loop())
+
+    async def stop(self) -> None:
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    async def get(self, name: str) -> Any:
+        handle = self.handles.get(name)
+        if handle is not None:
+            return handle
+
+        async with self.locks[name]:
+            handle = self.handles.get(name)
+            if handle is not None:
+                return handle
+
+            return await self.rebuild(name)
+
+    def invalidate(self, name: str) -> None:
+        self.handles.pop(name, None)
+        self.resolved_at.pop(name, None)
+
+    def version(self, name: str) -> str:
+        return self.versions.get(name, "")
+
+    async def rebuild(self, name: str) -> Any:
+        handle = await self.resolve(name)
+        version = self.version_of(handle)
+        previous_version = self.versions.get(name)
+
+        self.handles[name] = handle
+        self.resolved_at[name] = time.monotonic()
+        self.versions[name] = version
+
+        if previous_version is not None and previous_version != version:
+            log.info("Engine redeployed", engine=name, version=version)
+            for callback in self.on_version_change:
+                callback(name)
+
+        return handle
+
+    async def refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+
+            for name in self.engine_names:
+                try:
+                    async with self.locks[name]:
+                        await self.rebuild(name)
+                except Exception as e:
+                    # Keep serving the previous handle until a refresh succeeds
+                    log.error("Failed to refresh engine", engine=name, error=str(e))
@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class UnknownCursorError(ValueError):
+    def __init__(self, cursor: str):
+        super().__init__(f"Unknown history cursor: {cursor}")
+        self.cursor = cursor
+
+
+def convert_event(session_event: Any) -> Dict[str, Any]:
+    return {
+        "id": session_event.name.split("/events/")[-1],
+        "author": session_event.author,
+        "content": (
+            {
+                "role": session_event.content.role,
+                "parts": {"text": session_event.content.parts[0].text},
+            }
+            if session_event.content
+            and session_event.content.role
+            and session_event.content.parts
+            else None
+        ),
+        "actions": {
+            "state_delta": (
+                session_event.actions.state_delta
+                if session_event.actions and session_event.actions.state_delta
+                else None
+            )
+        },
+        "timestamp": session_event.timestamp.isoformat(),
+    }
+
+
+def parse_timestamp(value: str) -> Optional[datetime.datetime]:
+    try:
+        timestamp = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+
+    return timestamp
+
+
+class SessionHistory:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.offset = 0
+        self.lock = asyncio.Lock()
+
+    @property
+    def total(self) -> int:
+        return self.offset + len(self.events)
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == 0
+
+    @property
+    def latest_event_id(self) -> Optional[str]:
+        return self.events[-1]["id"] if self.events else None
+
+    def extend(self, events: List[Dict[str, Any]], max_events: int) -> None:
+        for event in events:
+            if event["id"] in self.positions:
+                continue
+
+            self.positions[event["id"]] = self.total
+            self.events.append(event)
+
+        overflow = len(self.events) - max_events
+        if overflow > 0:
+            for event in self.events[:overflow]:
+                del self.positions[event["id"]]
+
+            self.events = self.events[overflow:]
+            self.offset += overflow
+
+    def etag(self, session_id: str, *params: Optional[Any]) -> str:
+        key = ":".join(
+            str(part)
+            for part in (session_id, self.total, self.latest_event_id, *params)
+        )
+        return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+    def start_position(self, after: Optional[str]) -> Optional[int]:
+        """
+        Position of the first event after `after` (an event id or timestamp), or None if it is outside the cache.
+
+        Without `after`, the page starts at the oldest cached event, so a default request never has to read the full
+        session however long it gets; older events are paged with `before`.
+        """
+        if after is None:
+            return 0
+
+        if after in self.positions:
+            return self.positions[after] + 1 - self.offset
+
+        timestamp = parse_timestamp(after)
+        if timestamp is None:
+            return None
+
+        for position, event in enumerate(self.events):
+            if parse_timestamp(event["timestamp"]) > timestamp:
+                return position if position > 0 or self.complete else None
+
+        return len(self.events)
+
+
+def paginate(
+    events: List[Dict[str, Any]], start: int, limit: Optional[int]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    end = len(events) if limit is None else min(start + limit, len(events))
+    page = events[start:end]
+    next_cursor = page[-1]["id"] if page and end < len(events) else None
+    return page, next_cursor
+
+
+class HistoryCache:
+    """
+    Bounded per-session cache of already-converted session events.
+
+    Each load only asks upstream for events newer than the last cached one, so reloads stay cheap however long the session gets.
+    Pages return a cursor for the events after them and, when older events were evicted from the cache, one for the
+    events before them. A cursor that matches no event of the session raises `UnknownCursorError`.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, Optional[str]], Awaitable[List[Any]]],
+        max_sessions: int,
+        max_events: int,
+    ):
+        self.fetch = fetch
+        self.max_sessions = max_sessions
+        self.max_events = max_events
+        self.entries: "OrderedDict[str, SessionHistory]" = OrderedDict()
+
+    async def load(self, session_id: str) -> SessionHistory:
+        history = self.entries.get(session_id)
+        if history is None:
+            history = SessionHistory()
+            self.entries[session_id] = history
+
+        self.entries.move_to_end(session_id)
+        while len(self.entries) > self.max_sessions:
+            self.entries.popitem(last=False)
+
+        async with history.lock:
+            after = history.events[-1]["timestamp"] if history.events else None
+            session_events = await self.fetch(session_id, after)
+            history.extend(
+                [convert_event(session_event) for session_event in session_events],
+                self.max_events,
+            )
+
+        return history
+
+    async def page(
+        self,
+        session_id: str,
+        history: SessionHistory,
+        after: Optional[str],
+        limit: Optional[int],
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        start = history.start_position(after)
+        if start is not None:
+            page, next_cursor = paginate(history.events, start, limit)
+            previous_cursor = (
+                page[0]["id"] if page and start == 0 and not history.complete else None
+            )
+            return page, next_cursor, previous_cursor
+
+        # The requested window starts before the cached tail, so read the full session
+        events = await self.read_all(session_id)
+        uncached = SessionHistory()
+        uncached.extend(events, len(events))
+
+        start = uncached.start_position(after)
+        if start is None:
+            raise UnknownCursorError(after)
+
+        page, next_cursor = paginate(events, start, limit)
+        return page, next_cursor, None
+
+    async def page_before(
+        self, session_id: str, before: str, limit: Optional[int]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[str]]:
+        """The events before event `before`, newest last; only reached by paging back past the cached tail."""
+        events = await self.read_all(session_id)
+        end = next((i for i, event in enumerate(events) if event["id"] == before), None)
+        if end is None:
+            raise UnknownCursorError(before)
+
+        start = 0 if limit is None else max(0, end - limit)
+        page = events[start:end]
+        previous_cursor = page[0]["id"] if page and start > 0 else None
+        next_cursor = page[-1]["id"] if page and end < len(events) else None
+        return page, next_cursor, previous_cursor
+
+    async def read_all(self, session_id: str) -> List[Dict[str, Any]]:
+        return [
+            convert_event(session_event)
+            for session_event in await self.fetch(session_id, None)
+        ]
+
+    def invalidate(self, session_id: str) -> None:
+        self.entries.pop(session_id, None)
@@ -0,0 +1,156 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Any, Dict, Iterable, Optional
+
+REDACTED = "[REDACTED]"
+
+logger = logging.getLogger("server")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a background listener without formatting them on the caller's thread.
+
+    When the queue is full the record is dropped and counted instead of blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_payload_chars: int, redact_keys: Iterable[str]):
+        super().__init__()
+        self.max_payload_chars = max_payload_chars
+        self.redact_keys = {key.lower() for key in redact_keys}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+
+        if hasattr(record, "payload"):
+            entry["payload"] = self.truncate(
+                json.dumps(self.redact(record.payload), default=str)
+            )
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+    def redact(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                k: REDACTED if str(k).lower() in self.redact_keys else self.redact(v)
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [self.redact(v) for v in value]
+        return value
+
+    def truncate(self, text: str) -> str:
+        if len(text) <= self.max_payload_chars:
+            return text
+        return f"{text[: self.max_payload_chars]}...(+{len(text) - self.max_payload_chars} chars)"
+
+
+class PayloadSampler:
+    def __init__(self, rates: Dict[str, float], default_rate: float):
+        self.rates = rates
+        self.default_rate = default_rate
+
+    def sample(self, route: str) -> bool:
+        rate = self.rates.get(route, self.default_rate)
+        return rate > 0 and random.random() < rate
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    rates = {}
+
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        route, _, rate = item.partition("=")
+        rates[route.strip()] = float(rate)
+
+    return rates
+
+
+handler: Optional[DroppingQueueHandler] = None
+listener: Optional[logging.handlers.QueueListener] = None
+sampler = PayloadSampler({}, 0.0)
+
+
+def setup(
+    level: str,
+    queue_size: int,
+    payload_sampling: Dict[str, float],
+    payload_default_rate: float,
+    max_payload_chars: int,
+    redact_keys: Iterable[str],
+) -> None:
+    global handler, listener, sampler
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter(max_payload_chars, redact_keys))
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+    sampler = PayloadSampler(payload_sampling, payload_default_rate)
+
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    listener.start()
+
+
+def shutdown() -> None:
+    if listener:
+        listener.stop()
+
+
+def dropped() -> int:
+    return handler.dropped if handler else 0
+
+
+def debug(message: str, **fields: Any) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, extra={"fields": fields})
+
+
+def info(message: str, **fields: Any) -> None:
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(message, extra={"fields": fields})
+
+
+def warning(message: str, **fields: Any) -> None:
+    logger.warning(message, extra={"fields": fields})
+
+
+def error(message: str, **fields: Any) -> None:
+    logger.error(message, extra={"fields": fields})
+
+
+def payload(route: str, message: str, body: Any, **fields: Any) -> None:
+    """Logs `body` only for the sampled fraction of `route` calls; it is redacted, serialized and truncated off the event loop."""
+    if not logger.isEnabledFor(logging.DEBUG) or not sampler.sample(route):
+        return
+
+    logger.debug(message, extra={"fields": {"route": route, **fields}, "payload": body})
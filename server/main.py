@@ -1,14 +1,45 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
 import os
-import json
+import asyncio
 import uuid
 import datetime
-import vertexai
+import functools
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import StreamingResponse
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Body,
+    Depends,
+    Header,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Literal, Optional
+
+import log
+import metrics
+import serialization
+from admission import AdmissionController, AdmissionRejected, Permit
+from advisor_cache import AdvisorCache, synthesize_events
+from compression import CompressionMiddleware
+from engines import EngineRegistry
+from history import HistoryCache, UnknownCursorError
+from pool import SessionPool
+from runs import IdempotencyConflictError, Run, RunRegistry, parse_last_event_id
+from session_index import SessionIndex
+from singleflight import SingleFlight
+from startup import Startup
+from streaming import PROFILES, StreamTransform, parse_output, with_heartbeat
+from upstream import Upstream, UpstreamError, UpstreamPolicy, is_not_found
+from writes import SessionWriter
 
 load_dotenv()
 
@@ -17,6 +48,55 @@ PROJECT_ID = os.getenv("PROJECT_ID")
 LOCATION = os.getenv("LOCATION")
 RESOURCE_ID_AGENT = os.getenv("RESOURCE_ID_AGENT")
 RESOURCE_ID_ADVISOR = os.getenv("RESOURCE_ID_ADVISOR")
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", 32))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 30))
+UPSTREAM_READ_RETRIES = int(os.getenv("UPSTREAM_READ_RETRIES", 2))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", 0.2))
+UPSTREAM_READ_DEADLINE = float(os.getenv("UPSTREAM_READ_DEADLINE", 10))
+UPSTREAM_HEDGE_AFTER = float(os.getenv("UPSTREAM_HEDGE_AFTER", 0))
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", 5))
+UPSTREAM_BREAKER_RESET_TIMEOUT = float(os.getenv("UPSTREAM_BREAKER_RESET_TIMEOUT", 30))
+ENGINE_HANDLE_TTL = float(os.getenv("ENGINE_HANDLE_TTL", 300))
+SESSION_POOL_LOW_WATERMARK = int(os.getenv("SESSION_POOL_LOW_WATERMARK", 0))
+SESSION_POOL_HIGH_WATERMARK = int(os.getenv("SESSION_POOL_HIGH_WATERMARK", 1))
+SESSION_POOL_MAX_USERS = int(os.getenv("SESSION_POOL_MAX_USERS", 1000))
+SESSION_POOL_PRIME_AGENT_ON_ADVISOR = (
+    os.getenv("SESSION_POOL_PRIME_AGENT_ON_ADVISOR", "false").lower() == "true"
+)
+SESSION_INDEX_PATH = os.getenv("SESSION_INDEX_PATH", "sessions.db")
+SESSION_INDEX_MAX_CACHED = int(os.getenv("SESSION_INDEX_MAX_CACHED", 100000))
+SESSION_INDEX_MAX_AGE = float(os.getenv("SESSION_INDEX_MAX_AGE", 86400))
+HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", 1000))
+HISTORY_CACHE_MAX_EVENTS = int(os.getenv("HISTORY_CACHE_MAX_EVENTS", 500))
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", 3))
+WRITE_RETRY_BACKOFF = float(os.getenv("WRITE_RETRY_BACKOFF", 0.2))
+INITIAL_STATE_KEYS = set(os.getenv("INITIAL_STATE_KEYS", "gender,locale").split(","))
+ADVISOR_CACHE_MAX_ENTRIES = int(os.getenv("ADVISOR_CACHE_MAX_ENTRIES", 512))
+ADVISOR_CACHE_TTL = float(os.getenv("ADVISOR_CACHE_TTL", 3600))
+ADVISOR_PROMPT_VERSION = os.getenv("ADVISOR_PROMPT_VERSION", "1")
+ADMISSION_MAX_PER_SESSION = int(os.getenv("ADMISSION_MAX_PER_SESSION", 1))
+ADMISSION_SESSION_QUEUE_SIZE = int(os.getenv("ADMISSION_SESSION_QUEUE_SIZE", 1))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5))
+ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", 2))
+ADMISSION_MAX_GLOBAL = int(os.getenv("ADMISSION_MAX_GLOBAL", 64))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", 5))
+RUN_BUFFER_SIZE = int(os.getenv("RUN_BUFFER_SIZE", 256))
+RUN_RETENTION = float(os.getenv("RUN_RETENTION", 120))
+RUN_MAX_RETAINED = int(os.getenv("RUN_MAX_RETAINED", 1000))
+SSE_PROFILE = os.getenv("SSE_PROFILE", "full")
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSION_SSE = os.getenv("COMPRESSION_SSE", "true").lower() == "true"
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", 5))
+STARTUP_WAIT_TIMEOUT = float(os.getenv("STARTUP_WAIT_TIMEOUT", 10))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_PAYLOAD_SAMPLING = log.parse_sampling(os.getenv("LOG_PAYLOAD_SAMPLING", ""))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 512))
+LOG_REDACT_KEYS = os.getenv("LOG_REDACT_KEYS", "cart_id,email,phone,address").split(",")
 
 AGENT_ENGINE_BASE_URL = (
     f"projects/{PROJECT_ID}/locations/{LOCATION}/reasoningEngines/{RESOURCE_ID_AGENT}"
@@ -31,7 +111,47 @@ if not all([PROJECT_ID, LOCATION, RESOURCE_ID_AGENT, RESOURCE_ID_ADVISOR]):
         "Missing environment variables: PROJECT_ID, LOCATION, RESOURCE_ID_AGENT, or RESOURCE_ID_ADVISOR"
     )
 
-app = FastAPI()
+if SSE_PROFILE not in PROFILES:
+    raise RuntimeError(f"SSE_PROFILE must be one of: {', '.join(PROFILES)}")
+
+log.setup(
+    level=LOG_LEVEL,
+    queue_size=LOG_QUEUE_SIZE,
+    payload_sampling=LOG_PAYLOAD_SAMPLING,
+    payload_default_rate=LOG_PAYLOAD_SAMPLE_RATE,
+    max_payload_chars=LOG_PAYLOAD_MAX_CHARS,
+    redact_keys=LOG_REDACT_KEYS,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server starts listening (and answering /healthz) right away
+    startup.start()
+    yield
+    await startup.stop()
+    await runs.close()
+    await agent_pool.close()
+    await advisor_pool.close()
+    await session_writer.close()
+    await engines.stop()
+    upstream.shutdown()
+    session_index.close()
+    log.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=serialization.FastJSONResponse)
+
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    compress_streams=COMPRESSION_SSE,
+    observe=metrics.observe_compression,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,7 +164,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-client = vertexai.Client(project=PROJECT_ID, location=LOCATION)
+# Built during startup; see build_client
+client: Any = None
+
+# Older SDKs can only seed session state through a separate events.append
+SESSION_STATE_ON_CREATE = False
+
+# Display name of pre-created sessions until they are claimed; see SessionPool
+POOLED_SESSION_DISPLAY_NAME = "pooled"
+
+# Reads are idempotent, so they may be retried and hedged; writes get a single attempt per call, and SessionWriter
+# only retries the ones that certainly did not land
+read_policy = UpstreamPolicy(
+    retries=UPSTREAM_READ_RETRIES,
+    backoff=UPSTREAM_RETRY_BACKOFF,
+    hedge_after=UPSTREAM_HEDGE_AFTER or None,
+    deadline=UPSTREAM_READ_DEADLINE,
+)
+
+upstream = Upstream(
+    max_workers=UPSTREAM_MAX_WORKERS,
+    timeout=UPSTREAM_TIMEOUT,
+    observe=metrics.observe_upstream,
+    policies={
+        "agent_engines.get": read_policy,
+        "sessions.list": read_policy,
+        "sessions.events.list": read_policy,
+    },
+    breaker_threshold=UPSTREAM_BREAKER_THRESHOLD,
+    breaker_reset_timeout=UPSTREAM_BREAKER_RESET_TIMEOUT,
+    on_attempt=metrics.observe_attempt,
+)
+
+singleflight = SingleFlight()
+
+admission = AdmissionController(
+    max_per_session=ADMISSION_MAX_PER_SESSION,
+    session_queue_size=ADMISSION_SESSION_QUEUE_SIZE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    max_per_user=ADMISSION_MAX_PER_USER,
+    max_global=ADMISSION_MAX_GLOBAL,
+    retry_after=ADMISSION_RETRY_AFTER,
+    observe=metrics.observe_admission,
+)
+
+runs = RunRegistry(
+    buffer_size=RUN_BUFFER_SIZE,
+    retention=RUN_RETENTION,
+    max_runs=RUN_MAX_RETAINED,
+)
+
+session_writer = SessionWriter(
+    max_retries=WRITE_MAX_RETRIES,
+    retry_backoff=WRITE_RETRY_BACKOFF,
+)
+
+session_index = SessionIndex(
+    path=SESSION_INDEX_PATH,
+    max_cached=SESSION_INDEX_MAX_CACHED,
+    max_age=SESSION_INDEX_MAX_AGE,
+)
+
+
+async def resolve_engine(name: str) -> Any:
+    return await upstream.call("agent_engines.get", client.agent_engines.get, name=name)
+
+
+def engine_version(handle: Any) -> str:
+    api_resource = getattr(handle, "api_resource", None)
+    return str(getattr(api_resource, "update_time", "") or "")
+
+
+engines = EngineRegistry(
+    resolve=resolve_engine,
+    engine_names=[AGENT_ENGINE_BASE_URL, ADVISOR_ENGINE_BASE_URL],
+    ttl=ENGINE_HANDLE_TTL,
+    version_of=engine_version,
+)
+
+advisor_cache = AdvisorCache(
+    max_entries=ADVISOR_CACHE_MAX_ENTRIES,
+    ttl=ADVISOR_CACHE_TTL,
+    prompt_version=ADVISOR_PROMPT_VERSION,
+)
+
+
+def on_engine_redeployed(name: str) -> None:
+    if name == ADVISOR_ENGINE_BASE_URL:
+        advisor_cache.clear()
+
+
+engines.on_version_change.append(on_engine_redeployed)
+
+
+async def build_client() -> None:
+    global client, SESSION_STATE_ON_CREATE
+
+    # Imported here rather than at module level: the SDK import alone takes seconds
+    def build() -> Any:
+        import vertexai
+
+        return (
+            vertexai.Client(project=PROJECT_ID, location=LOCATION),
+            "session_state"
+            in vertexai.types.CreateAgentEngineSessionConfig.model_fields,
+        )
+
+    client, SESSION_STATE_ON_CREATE = await asyncio.to_thread(build)
+
+
+async def warm_engines() -> None:
+    await engines.warm()
+    engines.start()
+
+
+startup = Startup(
+    phases=[("client", build_client), ("engines", warm_engines)],
+    retry_interval=STARTUP_RETRY_INTERVAL,
+    observe=metrics.observe_startup,
+)
+
+
+async def require_ready() -> None:
+    if not await startup.wait(STARTUP_WAIT_TIMEOUT):
+        raise HTTPException(
+            status_code=503,
+            detail="Server is starting up",
+            headers={"Retry-After": str(max(1, int(STARTUP_RETRY_INTERVAL)))},
+        )
 
 
 class AgentResponse(BaseModel):
@@ -57,85 +304,386 @@ class AdvisorResponse(BaseModel):
     data: Dict[str, Any]
 
 
-@app.post("/api/chat/{user_id}/create-agent-session", response_model=AgentResponse)
+class InjectedMessage(BaseModel):
+    message: str
+    suggestions: List[str] = []
+
+
+StreamProfile = Literal["full", "ui", "final-only"]
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def release(permit: Optional[Permit]) -> None:
+    if permit is not None:
+        permit.release()
+
+
+def run_response(route: str, run: Run, after: int = 0) -> StreamingResponse:
+    return StreamingResponse(
+        metrics.instrument_stream(
+            route,
+            with_heartbeat(runs.subscribe(run, after), SSE_HEARTBEAT_INTERVAL),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+def list_latest_session_ids(engine_name: str, user_id: str, limit: int) -> List[str]:
+    session_ids = []
+
+    for session in client.agent_engines.sessions.list(
+        name=engine_name,
+        config={"filter": f"user_id={user_id}"},
+    ):
+        # Pre-created by any worker and not claimed yet
+        if getattr(session, "display_name", None) == POOLED_SESSION_DISPLAY_NAME:
+            continue
+
+        session_ids.append(session.name.split("/sessions/")[-1])
+
+        if len(session_ids) >= limit:
+            break
+
+    return session_ids
+
+
+async def get_latest_session_id(
+    engine_name: str, user_id: str, pool: SessionPool
+) -> Optional[str]:
+    latest_session_id = session_index.get(engine_name, user_id)
+    if latest_session_id is not None:
+        return latest_session_id
+
+    session_ids = await singleflight.do(
+        ("sessions.list", engine_name, user_id),
+        functools.partial(
+            upstream.call,
+            "sessions.list",
+            list_latest_session_ids,
+            engine_name,
+            user_id,
+            pool.high_watermark + 1,
+        ),
+    )
+
+    # Pre-warmed sessions the user has not claimed yet are not their latest session
+    for session_id in session_ids:
+        if session_id not in pool.pooled_ids:
+            session_index.put(engine_name, user_id, session_id)
+            return session_id
+
+    return None
+
+
+def forget_missing_session(engine_name: str, session_id: str, error: Exception) -> None:
+    # A session deleted or expired upstream must not be resumed, nor its history served from the cache
+    if is_not_found(error):
+        session_index.discard(engine_name, session_id)
+        history_cache.invalidate(session_id)
+
+
+def list_session_events(session_name: str, after: Optional[str] = None) -> List[Any]:
+    config = {"filter": f'timestamp>="{after}"'} if after else None
+
+    return list(
+        client.agent_engines.sessions.events.list(name=session_name, config=config)
+    )
+
+
+async def fetch_agent_events(session_id: str, after: Optional[str]) -> List[Any]:
+    return await upstream.call(
+        "sessions.events.list",
+        list_session_events,
+        f"{AGENT_ENGINE_BASE_URL}/sessions/{session_id}",
+        after,
+    )
+
+
+async def create_session(
+    engine_name: str,
+    user_id: str,
+    state: Optional[Dict[str, Any]] = None,
+    display_name: Optional[str] = None,
+) -> str:
+    config = {}
+    if state:
+        config["session_state"] = state
+    if display_name:
+        config["display_name"] = display_name
+
+    session = await upstream.call(
+        "sessions.create",
+        client.agent_engines.sessions.create,
+        name=engine_name,
+        user_id=user_id,
+        config=config or None,
+    )
+
+    return session.response.name.split("/sessions/")[-1]
+
+
+async def append_session_state(
+    engine_name: str, session_id: str, state: Dict[str, Any]
+) -> None:
+    from vertexai import types
+
+    config = types.AppendAgentEngineSessionEventConfig(
+        actions=types.EventActions(state_delta=state)
+    )
+
+    await upstream.call(
+        "sessions.events.append",
+        client.agent_engines.sessions.events.append,
+        name=f"{engine_name}/sessions/{session_id}",
+        author="shopify_agent",
+        invocation_id=f"e-{uuid.uuid4()}",
+        timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
+        config=config,
+    )
+
+
+def build_model_message(message: str, suggestions: List[str]) -> str:
+    return serialization.dumps(
+        {
+            "message": message,
+            "productComponent": None,
+            "tableComponent": None,
+            "suggestions": {"type": "default", "payload": suggestions},
+        }
+    )
+
+
+def queue_session_event(
+    engine_name: str,
+    session_id: str,
+    author: str,
+    content: Dict[str, Any],
+    invocation_id: Optional[str] = None,
+) -> None:
+    # Invocation id and timestamp are fixed at enqueue time so retries append the same event
+    write = functools.partial(
+        upstream.call,
+        "sessions.events.append",
+        client.agent_engines.sessions.events.append,
+        name=f"{engine_name}/sessions/{session_id}",
+        author=author,
+        invocation_id=invocation_id or f"e-{uuid.uuid4()}",
+        timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
+        config={"content": content},
+    )
+
+    session_writer.submit(session_id, write)
+
+
+def inject_model_message(session_id: str, model_message: str) -> None:
+    queue_session_event(
+        AGENT_ENGINE_BASE_URL,
+        session_id,
+        "shopify_agent",
+        {"role": "model", "parts": [{"text": model_message}]},
+    )
+
+
+def record_cached_advisor_turn(
+    session_id: str, message: str, events: List[Dict[str, Any]]
+) -> None:
+    """Appends a turn answered from the cache to the advisor session, so its history matches a live turn."""
+    invocation_id = events[0].get("invocation_id") if events else None
+
+    queue_session_event(
+        ADVISOR_ENGINE_BASE_URL,
+        session_id,
+        "user",
+        {"role": "user", "parts": [{"text": message}]},
+        invocation_id,
+    )
+
+    for event in events:
+        if event.get("content"):
+            queue_session_event(
+                ADVISOR_ENGINE_BASE_URL,
+                session_id,
+                event.get("author") or "shopify_advisor",
+                event["content"],
+                invocation_id,
+            )
+
+
+def is_complete_advisor_stream(events: List[Dict[str, Any]]) -> bool:
+    return any(
+        parse_output(part.get("text")) is not None
+        for event in events
+        for part in (event.get("content") or {}).get("parts") or []
+        if part.get("text")
+    )
+
+
+async def delete_session(engine_name: str, session_id: str) -> None:
+    await upstream.call(
+        "sessions.delete",
+        client.agent_engines.sessions.delete,
+        name=f"{engine_name}/sessions/{session_id}",
+    )
+
+
+async def untag_session(engine_name: str, session_id: str) -> None:
+    # The SDK only exposes session updates privately so far
+    sessions = client.agent_engines.sessions
+    update = getattr(sessions, "update", None) or sessions._update
+
+    await upstream.call(
+        "sessions.update",
+        update,
+        name=f"{engine_name}/sessions/{session_id}",
+        config={"display_name": "", "update_mask": "display_name"},
+    )
+
+
+agent_pool = SessionPool(
+    create=functools.partial(
+        create_session,
+        AGENT_ENGINE_BASE_URL,
+        display_name=POOLED_SESSION_DISPLAY_NAME,
+    ),
+    delete=functools.partial(delete_session, AGENT_ENGINE_BASE_URL),
+    release=functools.partial(untag_session, AGENT_ENGINE_BASE_URL),
+    low_watermark=SESSION_POOL_LOW_WATERMARK,
+    high_watermark=SESSION_POOL_HIGH_WATERMARK,
+    max_users=SESSION_POOL_MAX_USERS,
+)
+
+advisor_pool = SessionPool(
+    create=functools.partial(
+        create_session,
+        ADVISOR_ENGINE_BASE_URL,
+        display_name=POOLED_SESSION_DISPLAY_NAME,
+    ),
+    delete=functools.partial(delete_session, ADVISOR_ENGINE_BASE_URL),
+    release=functools.partial(untag_session, ADVISOR_ENGINE_BASE_URL),
+    low_watermark=SESSION_POOL_LOW_WATERMARK,
+    high_watermark=SESSION_POOL_HIGH_WATERMARK,
+    max_users=SESSION_POOL_MAX_USERS,
+)
+
+history_cache = HistoryCache(
+    fetch=fetch_agent_events,
+    max_sessions=HISTORY_CACHE_MAX_SESSIONS,
+    max_events=HISTORY_CACHE_MAX_EVENTS,
+)
+
+
+@app.post(
+    "/api/chat/{user_id}/create-agent-session",
+    response_model=AgentResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def create_agent_session(
     user_id: str,
     cart_id: str = Body(..., embed=True),
+    state: Optional[Dict[str, Any]] = Body(None, embed=True),
 ):
-    try:
-        session = client.agent_engines.sessions.create(
-            name=AGENT_ENGINE_BASE_URL,
-            user_id=user_id,
+    unknown_keys = set(state or {}) - INITIAL_STATE_KEYS
+    if unknown_keys:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported initial state keys: {', '.join(sorted(unknown_keys))}",
         )
 
-        session_id = session.response.name.split("/sessions/")[-1]
+    try:
+        initial_state = {**(state or {}), "cart_id": f"gid://shopify/Cart/{cart_id}"}
 
-        invocation_id = f"e-{uuid.uuid4()}"
+        session_id = await agent_pool.claim(user_id)
 
-        initialize_state = vertexai.types.EventActions(
-            state_delta={"cart_id": f"gid://shopify/Cart/{cart_id}"}
-        )
+        if session_id is None and SESSION_STATE_ON_CREATE:
+            session_id = await create_session(
+                AGENT_ENGINE_BASE_URL, user_id, initial_state
+            )
+        else:
+            if session_id is None:
+                session_id = await create_session(AGENT_ENGINE_BASE_URL, user_id)
 
-        config = vertexai.types.AppendAgentEngineSessionEventConfig(
-            actions=initialize_state
-        )
+            # Seed the state after responding; the first turn waits on this write
+            session_writer.submit(
+                session_id,
+                functools.partial(
+                    append_session_state,
+                    AGENT_ENGINE_BASE_URL,
+                    session_id,
+                    initial_state,
+                ),
+            )
 
-        client.agent_engines.sessions.events.append(
-            name=f"{AGENT_ENGINE_BASE_URL}/sessions/{session_id}",
-            author="shopify_agent",
-            invocation_id=invocation_id,
-            timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
-            config=config,
-        )
+        session_index.put(AGENT_ENGINE_BASE_URL, user_id, session_id)
 
-        print(
-            f"✅ NOTE: /api/chat/{user_id}/create-agent-session returned: {{'sessionId': '{session_id}'}}"
+        log.info(
+            "Agent session created",
+            route="create-agent-session",
+            user_id=user_id,
+            session_id=session_id,
         )
         return AgentResponse(success=True, data={"sessionId": session_id})
+    except UpstreamError as e:
+        log.error(
+            "Upstream call failed",
+            route="create-agent-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{user_id}/create-agent-session failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(
+            "Request failed",
+            route="create-agent-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.post("/api/chat/{session_id}/inject-agent-message", response_model=AgentResponse)
+@app.post(
+    "/api/chat/{session_id}/inject-agent-message",
+    response_model=AgentResponse,
+    status_code=202,
+    dependencies=[Depends(require_ready)],
+)
 async def inject_agent_message(
     session_id: str,
     message: str = Body(..., embed=True),
 ):
     try:
-        invocation_id = f"e-{uuid.uuid4()}"
-
-        model_message = json.dumps(
-            {
-                "message": message,
-                "productComponent": None,
-                "tableComponent": None,
-                "suggestions": {"type": "default", "payload": []},
-            }
-        )
-
-        client.agent_engines.sessions.events.append(
-            name=f"{AGENT_ENGINE_BASE_URL}/sessions/{session_id}",
-            author="shopify_agent",
-            invocation_id=invocation_id,
-            timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
-            config={
-                "content": {"role": "model", "parts": [{"text": model_message}]},
-            },
-        )
+        model_message = build_model_message(message, [])
 
-        print(
-            f"✅ NOTE: /api/chat/{session_id}/inject-agent-message returned: {{'injectedAgentMessage': '{model_message}'}}"
+        inject_model_message(session_id, model_message)
+
+        log.info(
+            "Agent message queued",
+            route="inject-agent-message",
+            session_id=session_id,
+        )
+        log.payload(
+            "inject-agent-message",
+            "Injected agent message",
+            model_message,
+            session_id=session_id,
         )
         return AgentResponse(success=True, data={"injectedAgentMessage": model_message})
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{session_id}/inject-agent-message failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(
+            "Request failed",
+            route="inject-agent-message",
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @app.post(
     "/api/chat/{session_id}/inject-agent-message-from-advisor",
     response_model=AgentResponse,
+    status_code=202,
+    dependencies=[Depends(require_ready)],
 )
 async def inject_agent_message_from_advisor(
     session_id: str,
@@ -143,208 +691,642 @@ async def inject_agent_message_from_advisor(
     suggestions: List[str] = Body(..., embed=True),
 ):
     try:
-        invocation_id = f"e-{uuid.uuid4()}"
-
-        model_message = json.dumps(
-            {
-                "message": message,
-                "productComponent": None,
-                "tableComponent": None,
-                "suggestions": {"type": "default", "payload": suggestions},
-            }
-        )
-
-        client.agent_engines.sessions.events.append(
-            name=f"{AGENT_ENGINE_BASE_URL}/sessions/{session_id}",
-            author="shopify_agent",
-            invocation_id=invocation_id,
-            timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
-            config={
-                "content": {"role": "model", "parts": [{"text": model_message}]},
-            },
-        )
+        model_message = build_model_message(message, suggestions)
 
-        print(
-            f"✅ NOTE: /api/chat/{session_id}/inject-agent-message-from-advisor returned: {{'injectedAgentMessage': '{model_message}'}}"
+        inject_model_message(session_id, model_message)
+
+        log.info(
+            "Agent message queued",
+            route="inject-agent-message-from-advisor",
+            session_id=session_id,
+        )
+        log.payload(
+            "inject-agent-message-from-advisor",
+            "Injected agent message",
+            model_message,
+            session_id=session_id,
         )
         return AgentResponse(success=True, data={"injectedAgentMessage": model_message})
     except Exception as e:
-        print(
-            f"❌ ERROR: /api/chat/{session_id}/inject-agent-message-from-advisor failed: {e}"
+        log.error(
+            "Request failed",
+            route="inject-agent-message-from-advisor",
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post(
+    "/api/chat/{session_id}/inject-agent-messages",
+    response_model=AgentResponse,
+    status_code=202,
+    dependencies=[Depends(require_ready)],
+)
+async def inject_agent_messages(
+    session_id: str,
+    messages: List[InjectedMessage] = Body(..., embed=True, min_length=1),
+):
+    try:
+        model_messages = [
+            build_model_message(item.message, item.suggestions) for item in messages
+        ]
+
+        for model_message in model_messages:
+            inject_model_message(session_id, model_message)
+
+        log.info(
+            "Agent messages queued",
+            route="inject-agent-messages",
+            session_id=session_id,
+            messages=len(model_messages),
+        )
+        log.payload(
+            "inject-agent-messages",
+            "Injected agent messages",
+            model_messages,
+            session_id=session_id,
+        )
+        return AgentResponse(
+            success=True, data={"injectedAgentMessages": model_messages}
+        )
+    except Exception as e:
+        log.error(
+            "Request failed",
+            route="inject-agent-messages",
+            session_id=session_id,
+            error=str(e),
         )
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @app.post(
     "/api/chat/{user_id}/{session_id}/send-agent-message",
     response_class=StreamingResponse,
+    dependencies=[Depends(require_ready)],
 )
 async def send_agent_message(
     user_id: str,
     session_id: str,
     message: str = Body(..., embed=True),
+    profile: Optional[StreamProfile] = None,
+    idempotency_key: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
 ):
+    permit = None
+
     try:
-        adk_application = client.agent_engines.get(name=AGENT_ENGINE_BASE_URL)
+        resumed_run_id, after = parse_last_event_id(last_event_id)
+        run_id = idempotency_key or resumed_run_id
 
-        async def event_stream():
-            print(
-                f"✅ NOTE: /api/chat/{user_id}/{session_id}/send-agent-message streaming started."
+        run = runs.get(session_id, run_id, message) if run_id else None
+
+        if run is not None:
+            log.info(
+                "Attached to chat run",
+                route="send-agent-message",
+                user_id=user_id,
+                session_id=session_id,
+                run_id=run.run_id,
+                after=after,
             )
+            return run_response("send-agent-message", run, after)
+
+        run = runs.create(session_id, run_id, message)
+
+        try:
+            upstream.ensure_available("async_stream_query")
+
+            permit = await admission.acquire(user_id, session_id)
+
+            adk_application = await engines.get(AGENT_ENGINE_BASE_URL)
+
+            await session_writer.flush(session_id)
+        except Exception as e:
+            runs.discard(session_id, run, e)
+            raise
+
+        transform = StreamTransform(profile or SSE_PROFILE)
 
-            async for event in adk_application.async_stream_query(
+        async def event_stream():
+            log.info(
+                "Streaming started",
+                route="send-agent-message",
                 user_id=user_id,
                 session_id=session_id,
-                message=message,
-            ):
-                print(f"🟢 EVENT: {json.dumps(event, indent=2)}")
-                yield f"data: {json.dumps(event)}\n\n"
+            )
+
+            query_started = time.perf_counter()
+
+            try:
+                async for event in adk_application.async_stream_query(
+                    user_id=user_id,
+                    session_id=session_id,
+                    message=message,
+                ):
+                    log.payload(
+                        "send-agent-message",
+                        "Stream event",
+                        event,
+                        session_id=session_id,
+                    )
+                    for frame in transform.frames(event):
+                        yield frame
+            except Exception as e:
+                upstream.record(
+                    "async_stream_query", time.perf_counter() - query_started, e
+                )
+                # Drop the shared handle so the next turn rebuilds it
+                engines.invalidate(AGENT_ENGINE_BASE_URL)
+                forget_missing_session(AGENT_ENGINE_BASE_URL, session_id, e)
+                log.error(
+                    "Streaming failed",
+                    route="send-agent-message",
+                    user_id=user_id,
+                    session_id=session_id,
+                    error=str(e),
+                )
+                raise
 
-            print(
-                f"✅ NOTE: /api/chat/{user_id}/{session_id}/send-agent-message streaming ended."
+            upstream.record(
+                "async_stream_query", time.perf_counter() - query_started, None
             )
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+            log.info(
+                "Streaming ended",
+                route="send-agent-message",
+                user_id=user_id,
+                session_id=session_id,
+            )
+
+        runs.start(run, event_stream(), on_done=permit.release)
+
+        return run_response("send-agent-message", run)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        log.warning(
+            "Chat run rejected",
+            route="send-agent-message",
+            user_id=user_id,
+            session_id=session_id,
+            reason=e.reason,
+        )
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": e.retry_after_header},
+        )
+    except UpstreamError as e:
+        release(permit)
+        log.error(
+            "Upstream call failed",
+            route="send-agent-message",
+            user_id=user_id,
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(
-            f"❌ ERROR: /api/chat/{user_id}/{session_id}/send-agent-message failed: {e}"
+        release(permit)
+        forget_missing_session(AGENT_ENGINE_BASE_URL, session_id, e)
+        log.error(
+            "Request failed",
+            route="send-agent-message",
+            user_id=user_id,
+            session_id=session_id,
+            error=str(e),
         )
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/api/chat/{user_id}/latest-agent-session", response_model=AgentResponse)
+@app.get(
+    "/api/chat/{user_id}/latest-agent-session",
+    response_model=AgentResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def get_latest_agent_session(user_id: str):
     try:
-        latest_session_id = None
+        latest_session_id = await get_latest_session_id(
+            AGENT_ENGINE_BASE_URL, user_id, agent_pool
+        )
 
-        for session in client.agent_engines.sessions.list(
-            name=AGENT_ENGINE_BASE_URL,
-            config={"filter": f"user_id={user_id}"},
-        ):
-            latest_session_id = session.name.split("/sessions/")[-1]
-            break
+        if latest_session_id is None:
+            agent_pool.prime(user_id)
 
-        print(
-            f"✅ NOTE: /api/chat/{user_id}/latest-agent-session returned: {{'latestSessionId': '{latest_session_id}'}}"
+        log.info(
+            "Latest agent session resolved",
+            route="latest-agent-session",
+            user_id=user_id,
+            session_id=latest_session_id,
         )
         return AgentResponse(success=True, data={"latestSessionId": latest_session_id})
+    except UpstreamError as e:
+        log.error(
+            "Upstream call failed",
+            route="latest-agent-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{user_id}/latest-agent-session failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(
+            "Request failed",
+            route="latest-agent-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/api/chat/{session_id}/agent-history", response_model=AgentResponse)
-async def get_agent_history(session_id: str):
+@app.get(
+    "/api/chat/{session_id}/agent-history",
+    response_model=AgentResponse,
+    dependencies=[Depends(require_ready)],
+)
+async def get_agent_history(
+    session_id: str,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
     try:
-        session_history = []
-
-        for session_event in client.agent_engines.sessions.events.list(
-            name=f"{AGENT_ENGINE_BASE_URL}/sessions/{session_id}",
-        ):
-            event = {
-                "author": session_event.author,
-                "content": (
-                    {
-                        "role": session_event.content.role,
-                        "parts": {"text": session_event.content.parts[0].text},
-                    }
-                    if session_event.content.role and session_event.content.parts
-                    else None
-                ),
-                "actions": {
-                    "state_delta": (
-                        session_event.actions.state_delta
-                        if session_event.actions.state_delta
-                        else None
-                    )
-                },
-                "timestamp": session_event.timestamp.isoformat(),
-            }
-            session_history.append(event)
+        await session_writer.flush(session_id, raise_failures=False)
 
-        print(
-            f"✅ NOTE: /api/chat/{session_id}/agent-history returned: {{'sessionEvents': '{session_history}'}}"
+        history = await singleflight.do(
+            ("sessions.events.list", session_id),
+            functools.partial(history_cache.load, session_id),
         )
-        return AgentResponse(success=True, data={"sessionEvents": session_history})
+
+        etag = history.etag(session_id, cursor, since, before, limit)
+        if request.headers.get("if-none-match") == etag:
+            log.info(
+                "Agent history not modified",
+                route="agent-history",
+                session_id=session_id,
+            )
+            return Response(status_code=304, headers={"ETag": etag})
+
+        if before:
+            session_history, next_cursor, previous_cursor = (
+                await history_cache.page_before(session_id, before, limit)
+            )
+        else:
+            session_history, next_cursor, previous_cursor = await history_cache.page(
+                session_id, history, cursor or since, limit
+            )
+
+        response.headers["ETag"] = etag
+
+        log.info(
+            "Agent history returned",
+            route="agent-history",
+            session_id=session_id,
+            events=len(session_history),
+        )
+        return AgentResponse(
+            success=True,
+            data={
+                "sessionEvents": session_history,
+                "nextCursor": next_cursor,
+                "previousCursor": previous_cursor,
+                "latestEventId": history.latest_event_id,
+            },
+        )
+    except UnknownCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UpstreamError as e:
+        log.error(
+            "Upstream call failed",
+            route="agent-history",
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{session_id}/agent-history failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        forget_missing_session(AGENT_ENGINE_BASE_URL, session_id, e)
+        log.error(
+            "Request failed",
+            route="agent-history",
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.post("/api/chat/{user_id}/create-advisor-session", response_model=AdvisorResponse)
+@app.post(
+    "/api/chat/{user_id}/create-advisor-session",
+    response_model=AdvisorResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def create_advisor_session(user_id: str):
     try:
-        session = client.agent_engines.sessions.create(
-            name=ADVISOR_ENGINE_BASE_URL,
-            user_id=user_id,
-        )
+        session_id = await advisor_pool.claim(user_id)
 
-        session_id = session.response.name.split("/sessions/")[-1]
+        if session_id is None:
+            session_id = await create_session(ADVISOR_ENGINE_BASE_URL, user_id)
 
-        print(
-            f"✅ NOTE: /api/chat/{user_id}/create-advisor-session returned: {{'sessionId': '{session_id}'}}"
+        session_index.put(ADVISOR_ENGINE_BASE_URL, user_id, session_id)
+
+        log.info(
+            "Advisor session created",
+            route="create-advisor-session",
+            user_id=user_id,
+            session_id=session_id,
         )
         return AdvisorResponse(success=True, data={"sessionId": session_id})
+    except UpstreamError as e:
+        log.error(
+            "Upstream call failed",
+            route="create-advisor-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{user_id}/create-advisor-session failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(
+            "Request failed",
+            route="create-advisor-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @app.post(
     "/api/chat/{user_id}/{session_id}/send-advisor-message",
     response_class=StreamingResponse,
+    dependencies=[Depends(require_ready)],
 )
 async def send_advisor_message(
     user_id: str,
     session_id: str,
     message: str = Body(..., embed=True),
+    profile: Optional[StreamProfile] = None,
+    idempotency_key: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
 ):
+    permit = None
+
     try:
-        adk_application = client.agent_engines.get(name=ADVISOR_ENGINE_BASE_URL)
+        resumed_run_id, after = parse_last_event_id(last_event_id)
+        run_id = idempotency_key or resumed_run_id
 
-        async def event_stream():
-            print(
-                f"✅ NOTE: /api/chat/{user_id}/{session_id}/send-advisor-message streaming started."
+        run = runs.get(session_id, run_id, message) if run_id else None
+
+        if run is not None:
+            log.info(
+                "Attached to chat run",
+                route="send-advisor-message",
+                user_id=user_id,
+                session_id=session_id,
+                run_id=run.run_id,
+                after=after,
+            )
+            return run_response("send-advisor-message", run, after)
+
+        run = runs.create(session_id, run_id, message)
+
+        try:
+            adk_application = await engines.get(ADVISOR_ENGINE_BASE_URL)
+
+            await session_writer.flush(session_id)
+
+            cache_key = advisor_cache.key(
+                engines.version(ADVISOR_ENGINE_BASE_URL), message
             )
+            cached_events = advisor_cache.get(cache_key)
+
+            # Cached replays never reach the model, so only live runs count against the limits
+            if cached_events is None:
+                upstream.ensure_available("async_stream_query")
+                permit = await admission.acquire(user_id, session_id)
+        except Exception as e:
+            runs.discard(session_id, run, e)
+            raise
 
-            async for event in adk_application.async_stream_query(
+        transform = StreamTransform(profile or SSE_PROFILE)
+
+        async def event_stream():
+            log.info(
+                "Streaming started",
+                route="send-advisor-message",
                 user_id=user_id,
                 session_id=session_id,
-                message=message,
-            ):
-                print(f"🟢 EVENT: {json.dumps(event, indent=2)}")
-                yield f"data: {json.dumps(event)}\n\n"
+                cached=cached_events is not None,
+            )
+
+            if cached_events is not None:
+                events = synthesize_events(cached_events)
+
+                for event in events:
+                    for frame in transform.frames(event):
+                        yield frame
+
+                record_cached_advisor_turn(session_id, message, events)
+
+                log.info(
+                    "Streaming ended",
+                    route="send-advisor-message",
+                    user_id=user_id,
+                    session_id=session_id,
+                    cached=True,
+                )
+                return
+
+            captured_events = []
+
+            query_started = time.perf_counter()
+
+            try:
+                async for event in adk_application.async_stream_query(
+                    user_id=user_id,
+                    session_id=session_id,
+                    message=message,
+                ):
+                    log.payload(
+                        "send-advisor-message",
+                        "Stream event",
+                        event,
+                        session_id=session_id,
+                    )
+                    captured_events.append(event)
+                    for frame in transform.frames(event):
+                        yield frame
+            except Exception as e:
+                upstream.record(
+                    "async_stream_query", time.perf_counter() - query_started, e
+                )
+                # Drop the shared handle so the next turn rebuilds it
+                engines.invalidate(ADVISOR_ENGINE_BASE_URL)
+                forget_missing_session(ADVISOR_ENGINE_BASE_URL, session_id, e)
+                log.error(
+                    "Streaming failed",
+                    route="send-advisor-message",
+                    user_id=user_id,
+                    session_id=session_id,
+                    error=str(e),
+                )
+                raise
 
-            print(
-                f"✅ NOTE: /api/chat/{user_id}/{session_id}/send-advisor-message streaming ended."
+            upstream.record(
+                "async_stream_query", time.perf_counter() - query_started, None
             )
 
-        return StreamingResponse(event_stream(), media_type="text/event-stream")
+            if is_complete_advisor_stream(captured_events):
+                advisor_cache.put(cache_key, captured_events)
+
+            log.info(
+                "Streaming ended",
+                route="send-advisor-message",
+                user_id=user_id,
+                session_id=session_id,
+            )
+
+        runs.start(run, event_stream(), on_done=permit.release if permit else None)
+
+        return run_response("send-advisor-message", run)
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        log.warning(
+            "Chat run rejected",
+            route="send-advisor-message",
+            user_id=user_id,
+            session_id=session_id,
+            reason=e.reason,
+        )
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": e.retry_after_header},
+        )
+    except UpstreamError as e:
+        release(permit)
+        log.error(
+            "Upstream call failed",
+            route="send-advisor-message",
+            user_id=user_id,
+            session_id=session_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(
-            f"❌ ERROR: /api/chat/{user_id}/{session_id}/send-advisor-message failed: {e}"
+        release(permit)
+        forget_missing_session(ADVISOR_ENGINE_BASE_URL, session_id, e)
+        log.error(
+            "Request failed",
+            route="send-advisor-message",
+            user_id=user_id,
+            session_id=session_id,
+            error=str(e),
         )
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.get("/api/chat/{user_id}/latest-advisor-session", response_model=AdvisorResponse)
+@app.get(
+    "/api/chat/{user_id}/latest-advisor-session",
+    response_model=AdvisorResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def get_latest_advisor_session(user_id: str):
     try:
-        latest_session_id = None
+        latest_session_id = await get_latest_session_id(
+            ADVISOR_ENGINE_BASE_URL, user_id, advisor_pool
+        )
 
-        for session in client.agent_engines.sessions.list(
-            name=ADVISOR_ENGINE_BASE_URL,
-            config={"filter": f"user_id={user_id}"},
-        ):
-            latest_session_id = session.name.split("/sessions/")[-1]
-            break
+        # New visitors open the advisor first. Warming their agent session too costs one more upstream session per new
+        # visitor (bots included) whether or not they ever chat, so it is opt-in
+        if latest_session_id is None:
+            advisor_pool.prime(user_id)
+            if SESSION_POOL_PRIME_AGENT_ON_ADVISOR:
+                agent_pool.prime(user_id)
 
-        print(
-            f"✅ NOTE: /api/chat/{user_id}/latest-advisor-session returned: {{'latestSessionId': '{latest_session_id}'}}"
+        log.info(
+            "Latest advisor session resolved",
+            route="latest-advisor-session",
+            user_id=user_id,
+            session_id=latest_session_id,
         )
         return AdvisorResponse(
             success=True, data={"latestSessionId": latest_session_id}
         )
+    except UpstreamError as e:
+        log.error(
+            "Upstream call failed",
+            route="latest-advisor-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
-        print(f"❌ ERROR: /api/chat/{user_id}/latest-advisor-session failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(
+            "Request failed",
+            route="latest-advisor-session",
+            user_id=user_id,
+            error=str(e),
+        )
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/healthz")
+async def get_health():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def get_readiness(response: Response):
+    stats = startup.stats()
+
+    if not stats["ready"]:
+        response.status_code = 503
+
+    return stats
+
+
+@app.get("/api/stats")
+async def get_stats():
+    return {
+        "sessionPools": {
+            "agent": agent_pool.stats(),
+            "advisor": advisor_pool.stats(),
+        },
+        "sessionWrites": session_writer.stats(),
+        "advisorCache": advisor_cache.stats(),
+        "singleFlight": singleflight.stats(),
+        "admission": admission.stats(),
+        "upstream": upstream.stats(),
+        "upstreamCircuits": upstream.breaker_states(),
+        "chatRuns": runs.stats(),
+        "droppedLogRecords": log.dropped(),
+        "jsonBackend": serialization.BACKEND,
+    }
+
+
+def collect_component_stats() -> None:
+    metrics.export_stats("agent_session_pool", agent_pool.stats())
+    metrics.export_stats("advisor_session_pool", advisor_pool.stats())
+    metrics.export_stats("session_writer", session_writer.stats())
+    metrics.export_stats("advisor_cache", advisor_cache.stats())
+    metrics.export_stats("single_flight", singleflight.stats())
+    metrics.export_stats("admission", admission.stats())
+    metrics.export_stats("upstream", upstream.stats())
+    metrics.export_circuit_states(upstream.breaker_states())
+    metrics.export_stats("chat_runs", runs.stats())
+    metrics.export_stats("log", {"droppedRecords": log.dropped()})
+
+
+metrics.registry.add_collector(collect_component_stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+startup.record("import", time.perf_counter() - IMPORT_STARTED)
@@ -0,0 +1,381 @@
+import math
+import re
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{format_labels(dict(zip(self.labelnames, key)))} {format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        series = self.series.get(key)
+        if series is None:
+            # One cumulative count per bucket, then sum and count
+            series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+
+        for key, series in self.series.items():
+            labels = dict(zip(self.labelnames, key))
+
+            for bound, count in zip(self.buckets, series):
+                bucket_labels = format_labels({**labels, "le": format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {int(count)}")
+
+            lines.append(f"{self.name}_sum{format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {int(series[-1])}")
+
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Registers a callback that refreshes gauges right before each scrape."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route, including the full body of streamed responses.",
+        ("method", "route", "status"),
+    )
+)
+
+UPSTREAM_REQUEST_DURATION = registry.register(
+    Histogram(
+        "upstream_request_duration_seconds",
+        "Latency of Vertex AI Agent Engine calls by operation.",
+        ("op", "outcome"),
+    )
+)
+
+UPSTREAM_ERRORS = registry.register(
+    Counter(
+        "upstream_errors_total",
+        "Failed Vertex AI Agent Engine calls by operation and error type.",
+        ("op", "error"),
+    )
+)
+
+UPSTREAM_EXTRA_ATTEMPTS = registry.register(
+    Counter(
+        "upstream_extra_attempts_total",
+        "Retried and hedged Vertex AI Agent Engine attempts by operation.",
+        ("op", "kind"),
+    )
+)
+
+UPSTREAM_CIRCUIT_STATE = registry.register(
+    Gauge(
+        "upstream_circuit_state",
+        "Circuit breaker state per operation: 0 closed, 1 half-open, 2 open.",
+        ("op",),
+    )
+)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+STREAM_FIRST_EVENT = registry.register(
+    Histogram(
+        "sse_time_to_first_event_seconds",
+        "Time from the start of an SSE stream to its first event.",
+        ("route",),
+    )
+)
+
+STREAM_DURATION = registry.register(
+    Histogram(
+        "sse_stream_duration_seconds",
+        "Total duration of SSE streams.",
+        ("route",),
+    )
+)
+
+STREAM_EVENTS = registry.register(
+    Histogram(
+        "sse_stream_events",
+        "Events sent per SSE stream.",
+        ("route",),
+        COUNT_BUCKETS,
+    )
+)
+
+STREAM_BYTES = registry.register(
+    Histogram(
+        "sse_stream_bytes",
+        "Bytes sent per SSE stream.",
+        ("route",),
+        SIZE_BUCKETS,
+    )
+)
+
+COMPRESSION_INPUT_BYTES = registry.register(
+    Counter(
+        "http_compression_input_bytes_total",
+        "Response bytes before compression, by route and encoding.",
+        ("route", "encoding"),
+    )
+)
+
+COMPRESSION_OUTPUT_BYTES = registry.register(
+    Counter(
+        "http_compression_output_bytes_total",
+        "Response bytes after compression, by route and encoding.",
+        ("route", "encoding"),
+    )
+)
+
+COMPRESSION_SAVED_BYTES = registry.register(
+    Counter(
+        "http_compression_saved_bytes_total",
+        "Response bytes saved by compression, by route and encoding (responses that grew count as zero).",
+        ("route", "encoding"),
+    )
+)
+
+ADMISSION_DECISIONS = registry.register(
+    Counter(
+        "admission_decisions_total",
+        "Chat run admission decisions by outcome and reason.",
+        ("decision", "reason"),
+    )
+)
+
+ADMISSION_WAIT = registry.register(
+    Histogram(
+        "admission_wait_seconds",
+        "Time chat runs spent queued behind another run on the same session.",
+        ("decision",),
+    )
+)
+
+STARTUP_PHASE_DURATION = registry.register(
+    Gauge(
+        "server_startup_phase_seconds",
+        "Duration of each startup phase: module import, then the background warm-up phases and their total.",
+        ("phase",),
+    )
+)
+
+COMPONENT_STATS = registry.register(
+    Gauge(
+        "component_stat",
+        "Point-in-time internal component statistics (pools, caches, queues).",
+        ("component", "stat"),
+    )
+)
+
+
+def snake_case(name: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+
+def export_stats(component: str, stats: Dict[str, Any]) -> None:
+    for stat, value in stats.items():
+        if isinstance(value, (int, float)):
+            COMPONENT_STATS.set(value, component=component, stat=snake_case(stat))
+
+
+def observe_upstream(op: str, seconds: float, error: Optional[BaseException]) -> None:
+    UPSTREAM_REQUEST_DURATION.observe(
+        seconds, op=op, outcome="error" if error else "success"
+    )
+
+    if error is not None:
+        UPSTREAM_ERRORS.inc(op=op, error=type(error).__name__)
+
+
+def observe_compression(route: str, encoding: str, raw: int, sent: int) -> None:
+    COMPRESSION_INPUT_BYTES.inc(raw, route=route, encoding=encoding)
+    COMPRESSION_OUTPUT_BYTES.inc(sent, route=route, encoding=encoding)
+    COMPRESSION_SAVED_BYTES.inc(max(0, raw - sent), route=route, encoding=encoding)
+
+
+def observe_startup(phase: str, seconds: float) -> None:
+    STARTUP_PHASE_DURATION.set(seconds, phase=phase)
+
+
+def observe_attempt(op: str, kind: str) -> None:
+    UPSTREAM_EXTRA_ATTEMPTS.inc(op=op, kind=kind)
+
+
+def export_circuit_states(states: Dict[str, str]) -> None:
+    for op, state in states.items():
+        UPSTREAM_CIRCUIT_STATE.set(CIRCUIT_STATES[state], op=op)
+
+
+def observe_admission(decision: str, reason: str, seconds: float) -> None:
+    ADMISSION_DECISIONS.inc(decision=decision, reason=reason)
+    ADMISSION_WAIT.observe(seconds, decision=decision)
+
+
+async def instrument_stream(
+    route: str, source: AsyncIterator[str]
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    events = 0
+    size = 0
+
+    try:
+        async for frame in source:
+            # SSE comments are heartbeats, not events
+            if not frame.startswith(":"):
+                if events == 0:
+                    STREAM_FIRST_EVENT.observe(
+                        time.perf_counter() - started, route=route
+                    )
+                events += 1
+
+            size += len(frame.encode())
+            yield frame
+    finally:
+        STREAM_DURATION.observe(time.perf_counter() - started, route=route)
+        STREAM_EVENTS.observe(events, route=route)
+        STREAM_BYTES.observe(size, route=route)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency per route template."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            )
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,210 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+import log
+
+
+class SessionPool:
+    """
+    Pre-created sessions for one engine, pooled per (anonymous) storefront user.
+
+    Agent Engine binds a session to its user_id at creation, so sessions are pre-created for users who are about to need one
+    (`prime`) and handed out by `claim`. A claim that finds a creation still in flight joins it instead of starting another.
+
+    `create` tags the sessions it makes as pooled, so they are not mistaken for a user's latest session by other workers or
+    after a restart; `release` removes the tag from a claimed session. It runs in the background, outside the session's
+    write queue, and is retried with backoff, since a session left tagged is never found again once its index entry
+    expires. Ready sessions are deleted on `close`.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[str], Awaitable[str]],
+        delete: Callable[[str], Awaitable[Any]],
+        release: Callable[[str], Awaitable[Any]],
+        low_watermark: int,
+        high_watermark: int,
+        max_users: int,
+        release_retries: int = 5,
+        release_backoff: float = 1.0,
+    ):
+        self.create = create
+        self.delete = delete
+        self.release = release
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.max_users = max_users
+        self.release_retries = release_retries
+        self.release_backoff = release_backoff
+
+        self.ready: "OrderedDict[str, Deque[str]]" = OrderedDict()
+        self.inflight: Dict[str, List[asyncio.Task]] = {}
+        self.pooled_ids: Set[str] = set()
+        self.background: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.refill_lag_total = 0.0
+        self.refill_lag_max = 0.0
+        self.release_failures = 0
+
+    def level(self, user_id: str) -> int:
+        return len(self.ready.get(user_id, ())) + len(self.inflight.get(user_id, ()))
+
+    def prime(self, user_id: str) -> None:
+        for _ in range(self.high_watermark - self.level(user_id)):
+            task = asyncio.create_task(self.refill_one(user_id))
+            task.add_done_callback(lambda t, u=user_id: self.on_refilled(u, t))
+            self.inflight.setdefault(user_id, []).append(task)
+
+    async def claim(self, user_id: str) -> Optional[str]:
+        session_id = None
+        ready = self.ready.get(user_id)
+
+        if ready:
+            session_id = ready.popleft()
+            self.pooled_ids.discard(session_id)
+        elif self.inflight.get(user_id):
+            task = self.inflight[user_id].pop(0)
+            try:
+                session_id = await task
+            except Exception:
+                session_id = None
+
+        self.cleanup(user_id)
+
+        if session_id is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.spawn(self.release_with_retry(session_id))
+
+        if self.level(user_id) < self.low_watermark:
+            self.prime(user_id)
+
+        return session_id
+
+    async def refill_one(self, user_id: str) -> str:
+        requested_at = time.monotonic()
+        session_id = await self.create(user_id)
+
+        lag = time.monotonic() - requested_at
+        self.refills += 1
+        self.refill_lag_total += lag
+        self.refill_lag_max = max(self.refill_lag_max, lag)
+
+        return session_id
+
+    def on_refilled(self, user_id: str, task: asyncio.Task) -> None:
+        tasks = self.inflight.get(user_id, [])
+
+        # A claim already took this task and consumes its result directly
+        if task not in tasks:
+            return
+
+        tasks.remove(task)
+
+        if task.cancelled():
+            self.cleanup(user_id)
+            return
+
+        if task.exception() is not None:
+            self.refill_failures += 1
+            log.error(
+                "Session pool refill failed",
+                user_id=user_id,
+                error=str(task.exception()),
+            )
+            self.cleanup(user_id)
+            return
+
+        session_id = task.result()
+        self.ready.setdefault(user_id, deque()).append(session_id)
+        self.ready.move_to_end(user_id)
+        self.pooled_ids.add(session_id)
+        self.cleanup(user_id)
+        self.evict()
+
+    def cleanup(self, user_id: str) -> None:
+        if user_id in self.ready and not self.ready[user_id]:
+            del self.ready[user_id]
+        if user_id in self.inflight and not self.inflight[user_id]:
+            del self.inflight[user_id]
+
+    async def release_with_retry(self, session_id: str) -> None:
+        for attempt in range(self.release_retries + 1):
+            try:
+                await self.release(session_id)
+                return
+            except Exception as e:
+                if attempt == self.release_retries:
+                    self.release_failures += 1
+                    log.error(
+                        "Claimed session is still tagged as pooled",
+                        session_id=session_id,
+                        error=str(e),
+                    )
+                    return
+
+                await asyncio.sleep(
+                    self.release_backoff * 2**attempt * random.uniform(0.5, 1.5)
+                )
+
+    def spawn(self, coroutine: Awaitable[Any]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    def evict(self) -> None:
+        while len(self.ready) > self.max_users:
+            _, session_ids = self.ready.popitem(last=False)
+
+            for session_id in session_ids:
+                self.pooled_ids.discard(session_id)
+                self.spawn(self.delete(session_id))
+
+    async def close(self, timeout: float = 5) -> None:
+        tasks = [task for tasks in self.inflight.values() for task in tasks]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Sessions left behind stay tagged as pooled, so they are never resumed as a user's latest session
+        session_ids = [s for session_ids in self.ready.values() for s in session_ids]
+        self.ready.clear()
+        self.pooled_ids.clear()
+
+        deletes = [asyncio.create_task(self.delete(s)) for s in session_ids]
+        deletes += list(self.background)
+
+        if deletes:
+            _, pending = await asyncio.wait(deletes, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*deletes, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        claims = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / claims if claims else 0.0,
+            "pooledSessions": len(self.pooled_ids),
+            "inflightRefills": sum(len(tasks) for tasks in self.inflight.values()),
+            "refills": self.refills,
+            "refillFailures": self.refill_failures,
+            "refillLagAvgSeconds": (
+                self.refill_lag_total / self.refills if self.refills else 0.0
+            ),
+            "refillLagMaxSeconds": self.refill_lag_max,
+            "releaseFailures": self.release_failures,
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+
+class IdempotencyConflictError(Exception):
+    def __init__(self, run_id: str):
+        super().__init__(
+            f"Idempotency key '{run_id}' was already used for another message"
+        )
+        self.run_id = run_id
+
+
+def parse_last_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """Splits a `<run id>:<sequence>` SSE event id; anything unparseable resumes from the start."""
+    if not value:
+        return None, 0
+
+    run_id, _, seq = value.rpartition(":")
+    if not run_id or not seq.isdigit():
+        return None, 0
+
+    return run_id, int(seq)
+
+
+class Run:
+    """One chat turn: frames from a single upstream run, kept in a bounded ring buffer that any number of clients tail."""
+
+    def __init__(self, run_id: str, message: str, buffer_size: int):
+        self.run_id = run_id
+        self.message = message
+        self.frames: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def append(self, frame: str) -> None:
+        self.seq += 1
+        self.frames.append((self.seq, f"id: {self.run_id}:{self.seq}\n{frame}"))
+        self.notify()
+
+    def finish(self, error: Optional[BaseException]) -> None:
+        self.done = True
+        self.error = error
+        self.finished_at = time.monotonic()
+        self.notify()
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[str]:
+        """Replays buffered frames after sequence `after`, then follows the live tail until the run ends."""
+        while True:
+            changed = self.changed
+
+            for seq, frame in list(self.frames):
+                if seq > after:
+                    after = seq
+                    yield frame
+
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+            await changed.wait()
+
+
+class RunRegistry:
+    """
+    Chat runs keyed by session and idempotency key.
+
+    Runs are produced by a background task independent of any client connection, so a dropped client can reconnect and
+    resume. Finished runs are kept for `retention` seconds to absorb retries; at most `max_runs` are kept overall.
+    """
+
+    def __init__(self, buffer_size: int, retention: float, max_runs: int):
+        self.buffer_size = buffer_size
+        self.retention = retention
+        self.max_runs = max_runs
+        self.runs: "OrderedDict[Tuple[str, str], Run]" = OrderedDict()
+
+        self.started = 0
+        self.attached = 0
+        self.resumed = 0
+
+    def get(self, session_id: str, run_id: str, message: str) -> Optional[Run]:
+        self.expire()
+
+        run = self.runs.get((session_id, run_id))
+        if run is None:
+            return None
+
+        if run.message != message:
+            raise IdempotencyConflictError(run_id)
+
+        self.attached += 1
+        return run
+
+    def create(self, session_id: str, run_id: Optional[str], message: str) -> Run:
+        """Registers a run before any setup awaits, so a concurrent retry attaches to it rather than starting another."""
+        self.expire()
+
+        run = Run(run_id or uuid.uuid4().hex, message, self.buffer_size)
+        self.runs[(session_id, run.run_id)] = run
+        self.started += 1
+        return run
+
+    def start(
+        self,
+        run: Run,
+        source: AsyncIterator[str],
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> None:
+        run.task = asyncio.create_task(self.produce(run, source, on_done))
+
+    def discard(self, session_id: str, run: Run, error: BaseException) -> None:
+        """Fails a run whose setup never completed; attached clients see the error and a retry starts afresh."""
+        if self.runs.get((session_id, run.run_id)) is run:
+            del self.runs[(session_id, run.run_id)]
+        run.finish(error)
+
+    async def produce(
+        self,
+        run: Run,
+        source: AsyncIterator[str],
+        on_done: Optional[Callable[[], None]],
+    ) -> None:
+        error = None
+
+        try:
+            async for frame in source:
+                run.append(frame)
+        except Exception as e:
+            error = e
+        finally:
+            run.finish(error)
+            if on_done:
+                on_done()
+
+    def subscribe(self, run: Run, after: int = 0) -> AsyncIterator[str]:
+        if after:
+            self.resumed += 1
+        return run.subscribe(after)
+
+    def expire(self) -> None:
+        now = time.monotonic()
+
+        for key, run in list(self.runs.items()):
+            if run.done and now - run.finished_at > self.retention:
+                del self.runs[key]
+
+        # Over capacity: drop the oldest finished runs first; in-flight runs are never dropped
+        if len(self.runs) > self.max_runs:
+            for key, run in list(self.runs.items()):
+                if len(self.runs) <= self.max_runs:
+                    break
+                if run.done:
+                    del self.runs[key]
+
+    async def close(self) -> None:
+        tasks = [run.task for run in self.runs.values() if run.task and not run.done]
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "activeRuns": sum(1 for run in self.runs.values() if not run.done),
+            "retainedRuns": len(self.runs),
+            "startedRuns": self.started,
+            "attachedRequests": self.attached,
+            "resumedStreams": self.resumed,
+        }
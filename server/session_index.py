@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class SessionIndex:
+    """
+    Maps each user to their most recent session per engine.
+
+    Lookups are answered from an in-memory LRU in front of a local SQLite table, so the index survives process restarts.
+    Entries older than `max_age` seconds are dropped, so the caller falls back to listing the user's sessions upstream;
+    `discard` drops an entry right away once its session turns out to be gone.
+    """
+
+    def __init__(self, path: str, max_cached: int, max_age: float):
+        self.max_cached = max_cached
+        self.max_age = max_age
+        self.cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS latest_sessions (
+                engine TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (engine, user_id)
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS latest_sessions_by_session ON latest_sessions (engine, session_id)"
+        )
+        self.connection.execute(
+            "DELETE FROM latest_sessions WHERE updated_at < ?",
+            (time.time() - max_age,),
+        )
+
+    def get(self, engine: str, user_id: str) -> Optional[str]:
+        key = (engine, user_id)
+
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                entry = self.connection.execute(
+                    "SELECT session_id, updated_at FROM latest_sessions WHERE engine = ? AND user_id = ?",
+                    key,
+                ).fetchone()
+
+                if entry is None:
+                    return None
+
+            session_id, updated_at = entry
+
+            if time.time() - updated_at >= self.max_age:
+                self.forget(key)
+                return None
+
+            self.remember(key, session_id, updated_at)
+            return session_id
+
+    def put(self, engine: str, user_id: str, session_id: str) -> None:
+        key = (engine, user_id)
+
+        updated_at = time.time()
+
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO latest_sessions VALUES (?, ?, ?, ?)",
+                (engine, user_id, session_id, updated_at),
+            )
+            self.remember(key, session_id, updated_at)
+
+    def discard(self, engine: str, session_id: str) -> None:
+        """Drops the entry pointing at `session_id`, if any."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT user_id FROM latest_sessions WHERE engine = ? AND session_id = ?",
+                (engine, session_id),
+            ).fetchone()
+
+            if row is not None:
+                self.forget((engine, row[0]))
+
+    def forget(self, key: Tuple[str, str]) -> None:
+        self.cache.pop(key, None)
+        self.connection.execute(
+            "DELETE FROM latest_sessions WHERE engine = ? AND user_id = ?", key
+        )
+
+    def remember(
+        self, key: Tuple[str, str], session_id: str, updated_at: float
+    ) -> None:
+        self.cache[key] = (session_id, updated_at)
+        self.cache.move_to_end(key)
+
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical upstream reads: callers with the same key share one in-flight call and its result.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self.forget(key, t))
+
+        # A disconnecting caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.leaders + self.coalesced
+
+        return {
+            "inflight": len(self.calls),
+            "upstreamCalls": self.leaders,
+            "coalescedRequests": self.coalesced,
+            "coalescedRate": self.coalesced / requests if requests else 0.0,
+        }
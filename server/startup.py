@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import log
+
+
+class Startup:
+    """
+    Runs warm-up phases in order in the background, so the server can accept connections (and answer liveness probes)
+    while it is still warming up.
+
+    A failed phase is retried every `retry_interval` seconds; later phases wait for it. `observe` receives each phase
+    and how long it took.
+    """
+
+    def __init__(
+        self,
+        phases: List[Tuple[str, Callable[[], Awaitable[Any]]]],
+        retry_interval: float,
+        observe: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.phases = phases
+        self.retry_interval = retry_interval
+        self.observe = observe
+        self.durations: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        started = time.perf_counter()
+
+        for phase, fn in self.phases:
+            phase_started = time.perf_counter()
+
+            while True:
+                try:
+                    await fn()
+                    break
+                except Exception as e:
+                    self.error = f"{phase}: {e}"
+                    log.error("Startup phase failed", phase=phase, error=str(e))
+                    await asyncio.sleep(self.retry_interval)
+
+            self.record(phase, time.perf_counter() - phase_started)
+
+        self.error = None
+        self.record("total", time.perf_counter() - started)
+        self.ready.set()
+
+        log.info(
+            "Server ready", **{f"{k}_seconds": v for k, v in self.durations.items()}
+        )
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = seconds
+        if self.observe:
+            self.observe(phase, seconds)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "phaseSeconds": dict(self.durations),
+            "error": self.error,
+        }
@@ -0,0 +1,170 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import serialization
+
+PROFILES = ("full", "ui", "final-only")
+
+PRODUCT_FIELDS = ("product_id", "title", "price_range", "image_url")
+
+# The agent's catalog search tools; both answer in the MCP tool result envelope
+CATALOG_TOOLS = ("search_shop_catalog", "search_local_catalog")
+
+HEARTBEAT = ": heartbeat\n\n"
+
+
+def encode_frame(data: Any, event: Optional[str] = None) -> str:
+    frame = f"data: {serialization.dumps(data)}\n\n"
+    return f"event: {event}\n{frame}" if event else frame
+
+
+def parse_output(value: Any) -> Optional[Dict[str, Any]]:
+    """Parses an AgentOutput / advisor Output payload, given either as a dict or as its JSON text."""
+    if isinstance(value, str):
+        try:
+            value = serialization.loads(value)
+        except ValueError:
+            return None
+
+    if isinstance(value, dict) and "message" in value and "suggestions" in value:
+        return value
+
+    return None
+
+
+def summarize_catalog_response(function_response: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        text = function_response["response"]["content"][0]["text"]
+        products = serialization.loads(text).get("products", [])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return {"name": function_response.get("name")}
+
+    slim_products = [
+        {field: product.get(field) for field in PRODUCT_FIELDS} for product in products
+    ]
+
+    return {
+        "name": function_response.get("name"),
+        "response": {
+            "content": [
+                {
+                    "type": "text",
+                    "text": serialization.dumps({"products": slim_products}),
+                }
+            ]
+        },
+    }
+
+
+class StreamTransform:
+    """
+    Turns raw ADK stream events into SSE frames for one of the wire profiles.
+
+    - full: every event, unchanged
+    - ui: only the parts the widget renders (final output, trimmed catalog results, cart tool names)
+    - final-only: only the typed `output` frames
+
+    Typed frames repeat what the kept parts already carry, so `ui` does not send them.
+    """
+
+    def __init__(self, profile: str):
+        self.profile = profile
+
+    def frames(self, event: Dict[str, Any]) -> List[str]:
+        if self.profile == "full":
+            return [encode_frame(event)]
+
+        content = event.get("content") or {}
+        kept_parts = []
+        typed_frames = []
+
+        for part in content.get("parts") or []:
+            function_call = part.get("function_call")
+            function_response = part.get("function_response")
+
+            if function_call:
+                if function_call.get("name") == "set_model_response":
+                    output = parse_output(function_call.get("args"))
+                    if output is not None:
+                        typed_frames.append(encode_frame(output, "output"))
+                    kept_parts.append({"function_call": function_call})
+                else:
+                    typed_frames.append(
+                        encode_frame({"name": function_call.get("name")}, "tool-call")
+                    )
+            elif function_response:
+                name = function_response.get("name") or ""
+
+                if name in CATALOG_TOOLS:
+                    kept_parts.append(
+                        {
+                            "function_response": summarize_catalog_response(
+                                function_response
+                            )
+                        }
+                    )
+                elif "cart" in name:
+                    kept_parts.append({"function_response": {"name": name}})
+
+                typed_frames.append(encode_frame({"name": name}, "tool-response"))
+            elif part.get("text"):
+                output = parse_output(part["text"])
+                if output is not None:
+                    typed_frames.append(encode_frame(output, "output"))
+                kept_parts.append({"text": part["text"]})
+
+        if self.profile == "final-only":
+            return [
+                frame for frame in typed_frames if frame.startswith("event: output")
+            ]
+
+        if not kept_parts:
+            return []
+
+        return [
+            encode_frame(
+                {
+                    "author": event.get("author"),
+                    "content": {"role": content.get("role"), "parts": kept_parts},
+                }
+            )
+        ]
+
+
+async def with_heartbeat(
+    source: AsyncIterator[str], interval: float
+) -> AsyncIterator[str]:
+    """
+    Re-yields `source` and emits an SSE comment whenever it stays silent for `interval` seconds.
+
+    The source is drained by a single pump task so the upstream stream is always consumed from the same task.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+    done = object()
+
+    async def pump():
+        try:
+            async for item in source:
+                await queue.put(item)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+
+            yield item
+    finally:
+        task.cancel()
@@ -0,0 +1,376 @@
+import asyncio
+import functools
+import math
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    status_code = 502
+    retry_after: Optional[float] = None
+
+    @property
+    def headers(self) -> Optional[Dict[str, str]]:
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class UpstreamTimeoutError(UpstreamError):
+    status_code = 504
+
+    def __init__(self, op: str, timeout: float):
+        super().__init__(f"Upstream call '{op}' timed out after {timeout}s")
+        self.op = op
+        self.timeout = timeout
+
+
+class UpstreamUnavailableError(UpstreamError):
+    status_code = 503
+
+    def __init__(self, op: str, retry_after: float):
+        super().__init__(f"Upstream call '{op}' is failing; try again shortly")
+        self.op = op
+        self.retry_after = retry_after
+
+
+def is_transient(error: BaseException) -> bool:
+    """Timeouts, dropped connections and 408/429/5xx responses; anything else is the caller's problem."""
+    if isinstance(error, (UpstreamTimeoutError, ConnectionError, TimeoutError)):
+        return True
+
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in TRANSIENT_STATUS_CODES
+
+
+def is_not_found(error: BaseException) -> bool:
+    """404 responses, and the error a query against a session that no longer exists streams back."""
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 404 or "session not found" in str(error).lower()
+
+
+class UpstreamPolicy:
+    """
+    How one upstream operation is called.
+
+    - timeout: per attempt, defaults to the upstream timeout
+    - retries / backoff: extra attempts after transient failures, with jittered exponential backoff; only for
+      idempotent operations
+    - hedge_after: start a second identical attempt if the first has not answered after this many seconds
+    - deadline: overall budget across all attempts and backoff
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        retries: int = 0,
+        backoff: float = 0.1,
+        hedge_after: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.deadline = deadline
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and fails fast for `reset_timeout` seconds, then
+    lets a single probe through (half-open) to decide whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probing = False
+
+        if self.state == self.HALF_OPEN:
+            # A probe whose outcome never got recorded (e.g. a cancelled request) must not wedge the breaker
+            now = time.monotonic()
+            if self.probing and now - self.probe_started < self.reset_timeout:
+                return False
+            self.probing = True
+            self.probe_started = now
+
+        return True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record(self, healthy: bool) -> None:
+        self.probing = False
+
+        if healthy:
+            self.failures = 0
+            self.state = self.CLOSED
+            return
+
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """
+    Runs blocking Vertex AI SDK calls on a bounded thread pool so they never stall the event loop.
+
+    Every call is named after the upstream operation (e.g. 'sessions.create') and follows that operation's
+    `UpstreamPolicy`. Each operation has its own circuit breaker. `observe` receives the operation, its duration and its
+    error (if any) after every call; `on_attempt` receives the operation and 'retry' or 'hedge' for each extra attempt.
+
+    A timed out attempt cannot be interrupted: its worker thread stays busy until the SDK call returns on its own. Such
+    workers are counted as abandoned in `stats`, and retries and hedges are only started while a worker is free, so
+    they never queue behind stuck calls.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float,
+        observe: Optional[Callable[[str, float, Optional[BaseException]], None]] = None,
+        policies: Optional[Dict[str, UpstreamPolicy]] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 30,
+        on_attempt: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.timeout = timeout
+        self.observe = observe
+        self.policies = policies or {}
+        self.default_policy = UpstreamPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.on_attempt = on_attempt
+        self.max_workers = max_workers
+        self.busy = 0
+        self.abandoned = 0
+        self.skipped_retries = 0
+        self.skipped_hedges = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="upstream",
+        )
+
+    def breaker(self, op: str) -> CircuitBreaker:
+        breaker = self.breakers.get(op)
+        if breaker is None:
+            breaker = self.breakers[op] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_reset_timeout
+            )
+        return breaker
+
+    def ensure_available(self, op: str) -> None:
+        """Fails fast while the operation's breaker is open; for calls not made through `call`, like streams."""
+        breaker = self.breaker(op)
+
+        if not breaker.allow():
+            error = UpstreamUnavailableError(op, breaker.retry_after())
+            if self.observe:
+                self.observe(op, 0.0, error)
+            raise error
+
+    def record(self, op: str, seconds: float, error: Optional[BaseException]) -> None:
+        """Reports the outcome of a call made outside `call` to the breaker and `observe`."""
+        self.breaker(op).record(error is None or not is_transient(error))
+
+        if self.observe:
+            self.observe(op, seconds, error)
+
+    async def call(
+        self,
+        op: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        policy = self.policies.get(op, self.default_policy)
+        breaker = self.breaker(op)
+        call = functools.partial(fn, *args, **kwargs)
+
+        started = time.perf_counter()
+        deadline = started + policy.deadline if policy.deadline else math.inf
+        error = None
+        attempt = 0
+
+        try:
+            if not breaker.allow():
+                raise UpstreamUnavailableError(op, breaker.retry_after())
+
+            while True:
+                attempt_timeout = min(
+                    timeout or policy.timeout or self.timeout,
+                    deadline - time.perf_counter(),
+                )
+                if attempt_timeout <= 0:
+                    raise UpstreamTimeoutError(op, policy.deadline)
+
+                try:
+                    result = await self.attempt(
+                        op, call, attempt_timeout, policy.hedge_after
+                    )
+                except Exception as e:
+                    transient = is_transient(e)
+                    breaker.record(not transient)
+
+                    if not transient or attempt >= policy.retries:
+                        raise
+
+                    attempt += 1
+                    delay = policy.backoff * 2 ** (attempt - 1)
+                    delay *= random.uniform(0.5, 1.5)
+
+                    if time.perf_counter() + delay >= deadline or not breaker.allow():
+                        raise
+
+                    if not self.free_workers():
+                        self.skipped_retries += 1
+                        raise
+
+                    if self.on_attempt:
+                        self.on_attempt(op, "retry")
+                    await asyncio.sleep(delay)
+                    continue
+
+                breaker.record(True)
+                return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.observe:
+                self.observe(op, time.perf_counter() - started, error)
+
+    async def attempt(
+        self,
+        op: str,
+        call: Callable[[], Any],
+        timeout: float,
+        hedge_after: Optional[float],
+    ) -> Any:
+        first = self.submit(call)
+
+        if hedge_after is None or hedge_after >= timeout:
+            # Shielded so the future outlives the wait and its worker is tracked until the call returns
+            try:
+                return await asyncio.wait_for(asyncio.shield(first), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.abandon([first])
+                raise UpstreamTimeoutError(op, timeout) from None
+            except asyncio.CancelledError:
+                self.abandon([first])
+                raise
+
+        attempt_deadline = time.perf_counter() + timeout
+        pending = {first}
+        hedged = False
+        error: Optional[BaseException] = None
+
+        while pending:
+            wait = hedge_after if not hedged else None
+            remaining = attempt_deadline - time.perf_counter()
+            wait = min(wait, remaining) if wait is not None else remaining
+
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, wait), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for future in done:
+                if future.exception() is None:
+                    self.abandon(pending)
+                    return future.result()
+                error = future.exception()
+
+            if done:
+                continue
+
+            if not hedged and time.perf_counter() < attempt_deadline:
+                hedged = True
+
+                # A hedge would only queue behind the calls already holding every worker
+                if not self.free_workers():
+                    self.skipped_hedges += 1
+                    continue
+
+                if self.on_attempt:
+                    self.on_attempt(op, "hedge")
+                pending.add(self.submit(call))
+                continue
+
+            self.abandon(pending)
+            raise UpstreamTimeoutError(op, timeout)
+
+        raise error
+
+    def submit(self, call: Callable[[], Any]) -> asyncio.Future:
+        with self.lock:
+            self.busy += 1
+
+        future = self.executor.submit(call)
+        future.add_done_callback(self.on_worker_done)
+        return asyncio.wrap_future(future)
+
+    def on_worker_done(self, future: Future) -> None:
+        # Runs on the worker thread
+        with self.lock:
+            self.busy -= 1
+
+    def abandon(self, futures: Any) -> None:
+        """Stops waiting on attempts that timed out or lost a race; their results or errors are dropped."""
+        for future in futures:
+            if future.done():
+                continue
+
+            self.abandoned += 1
+            future.add_done_callback(self.on_abandoned_done)
+
+    def on_abandoned_done(self, future: asyncio.Future) -> None:
+        self.abandoned -= 1
+        if not future.cancelled():
+            future.exception()
+
+    def free_workers(self) -> int:
+        with self.lock:
+            return self.max_workers - self.busy
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            busy = self.busy
+
+        return {
+            "maxWorkers": self.max_workers,
+            "busyWorkers": busy,
+            "abandonedWorkers": self.abandoned,
+            "skippedRetries": self.skipped_retries,
+            "skippedHedges": self.skipped_hedges,
+        }
+
+    def breaker_states(self) -> Dict[str, str]:
+        return {op: breaker.state for op, breaker in self.breakers.items()}
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,125 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import log
+from upstream import UpstreamTimeoutError, is_transient
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Transient failures of a write that certainly did not land. A timed out write may still be applied upstream, and
+    retrying it would append a duplicate event.
+    """
+    if isinstance(error, (UpstreamTimeoutError, TimeoutError)):
+        return False
+    return is_transient(error)
+
+
+class SessionWriter:
+    """
+    Write-behind queue for session writes: runs them in the background, strictly in submission order per session.
+
+    Writes that failed transiently without reaching upstream (see `is_retryable`) are retried with jittered backoff;
+    any other failure is final. `flush` is the barrier readers use to wait for everything submitted
+    to a session so far; it re-raises a write that failed for good. A failure is kept for `failure_ttl` seconds, for at
+    most `max_failures` sessions, so sessions that never come back do not hold on to theirs.
+    """
+
+    def __init__(
+        self,
+        max_retries: int,
+        retry_backoff: float,
+        max_failures: int = 10000,
+        failure_ttl: float = 3600,
+    ):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_failures = max_failures
+        self.failure_ttl = failure_ttl
+        self.tails: Dict[str, asyncio.Task] = {}
+        self.failures: "OrderedDict[str, Tuple[BaseException, float]]" = OrderedDict()
+
+        self.pending = 0
+        self.retries = 0
+        self.failed = 0
+
+    def submit(
+        self, session_id: str, write: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        previous = self.tails.get(session_id)
+
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            return await self.attempt(write)
+
+        self.pending += 1
+        task = asyncio.create_task(run())
+        self.tails[session_id] = task
+        task.add_done_callback(lambda t: self.on_done(session_id, t))
+        return task
+
+    async def attempt(self, write: Callable[[], Awaitable[Any]]) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await write()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+
+                self.retries += 1
+                await asyncio.sleep(
+                    self.retry_backoff * 2**attempt * random.uniform(0.5, 1.5)
+                )
+
+    def on_done(self, session_id: str, task: asyncio.Task) -> None:
+        self.pending -= 1
+
+        if self.tails.get(session_id) is task:
+            del self.tails[session_id]
+
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            self.failures.pop(session_id, None)
+            self.failures[session_id] = (task.exception(), time.monotonic())
+            self.prune_failures()
+            log.error(
+                "Background session write failed",
+                session_id=session_id,
+                error=str(task.exception()),
+            )
+
+    async def flush(self, session_id: str, raise_failures: bool = True) -> None:
+        task = self.tails.get(session_id)
+        if task is not None:
+            await asyncio.gather(asyncio.shield(task), return_exceptions=True)
+
+        self.prune_failures()
+
+        if raise_failures:
+            failure = self.failures.pop(session_id, None)
+            if failure is not None:
+                raise failure[0]
+
+    def prune_failures(self) -> None:
+        expired_before = time.monotonic() - self.failure_ttl
+
+        while self.failures and (
+            len(self.failures) > self.max_failures
+            or next(iter(self.failures.values()))[1] < expired_before
+        ):
+            self.failures.popitem(last=False)
+
+    async def close(self) -> None:
+        await asyncio.gather(*self.tails.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pendingWrites": self.pending,
+            "retries": self.retries,
+            "failedWrites": self.failed,
+            "pendingFailures": len(self.failures),
+        }
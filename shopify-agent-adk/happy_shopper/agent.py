@@ -1,6 +1,7 @@
 import os
 import json
-import requests
+import asyncio
+import logging
 from google.adk.agents import Agent
 from google.adk.tools import google_search
 from google.adk.tools.base_tool import BaseTool
@@ -12,6 +13,11 @@ from pydantic import BaseModel, Field
 from typing import List, Any, Dict, Optional
 from dotenv import load_dotenv
 
+from happy_shopper.shopify import PRODUCTS_PER_QUERY, admin_client
+from happy_shopper.product_cache import ProductCache
+from happy_shopper.session_products import SessionProducts, compact_product
+from happy_shopper.shaping import shape_response
+from happy_shopper.catalog import CatalogSync
 from happy_shopper.prompt import (
     SearchAgentInstruction,
     ShopifyAgentInstruction,
@@ -20,7 +26,32 @@ from happy_shopper.prompt import (
 load_dotenv()
 
 SHOPIFY_DOMAIN = os.getenv("SHOPIFY_DOMAIN")
-SHOPIFY_ADMIN_TOKEN = os.getenv("SHOPIFY_ADMIN_TOKEN")
+CATALOG_SEARCH_TOOLS = ("search_shop_catalog", "search_local_catalog")
+CART_ERROR_KEYS = ("errors", "user_errors", "userErrors", "warnings")
+SESSION_PRODUCT_LIMIT = int(os.getenv("SESSION_PRODUCT_LIMIT", "50"))
+TOOL_RESPONSE_TOKEN_BUDGET = int(os.getenv("TOOL_RESPONSE_TOKEN_BUDGET", "1500"))
+
+PRODUCT_VARIANTS_QUERY = """
+query ProductVariants($ids: [ID!]!) {
+    nodes(ids: $ids) {
+        ... on Product {
+            id
+            variants(first: 100) {
+                edges {
+                    node {
+                        id
+                        title
+                        price
+                        availableForSale
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+logger = logging.getLogger(__name__)
 
 
 class ProductsComponent(BaseModel):
@@ -60,135 +91,282 @@ class AgentOutput(BaseModel):
     )
 
 
-def after_tool_callback(
+async def fetch_product_variants(product_ids: List[str]) -> Dict[str, List[Dict]]:
+    """
+    Fetches the variants of several products in a single Admin GraphQL `nodes` query.
+
+    Returns the simplified variants keyed by product ID.
+    """
+    data = await admin_client().agraphql(PRODUCT_VARIANTS_QUERY, {"ids": product_ids})
+
+    variants_by_product = {}
+    for node in data.get("nodes") or []:
+        if not node:
+            continue
+
+        edges = node.get("variants", {}).get("edges", [])
+
+        variants_by_product[node["id"]] = [
+            {
+                "variant_id": variant.get("id"),
+                "title": variant.get("title"),
+                "price": variant.get("price"),
+                "available": variant.get("availableForSale"),
+            }
+            for variant in (e.get("node") for e in edges)
+            if variant
+        ]
+
+    return variants_by_product
+
+
+product_cache = ProductCache.from_env(refresh=fetch_product_variants)
+catalog = CatalogSync.from_env(admin_client(), shop_domain=SHOPIFY_DOMAIN or "")
+
+
+def lookup_product_variants(product_ids: List[str]) -> List[asyncio.Task]:
+    """
+    Starts the variant lookups for the given products, chunked to stay under the query cost limit.
+
+    The chunks run concurrently in the background; each task resolves to the variants keyed by product ID.
+    """
+    return [
+        asyncio.create_task(
+            fetch_product_variants(product_ids[i : i + PRODUCTS_PER_QUERY])
+        )
+        for i in range(0, len(product_ids), PRODUCTS_PER_QUERY)
+    ]
+
+
+async def after_tool_callback(
     tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Dict
 ) -> Optional[Dict]:
     """
     Intercepts tool responses after execution.
 
-    If the 'search_shop_catalog' MCP tool is called, cache its response in the session state under 'cached_products'.
+    If the 'search_shop_catalog' MCP tool or the 'search_local_catalog' tool (which answers in the same envelope) is
+    called, cache its products in the session state (see SessionProducts) and replace the response with one shaped to
+    TOOL_RESPONSE_TOKEN_BUDGET tokens. If an 'update_cart' call fails, drop the products it referenced from the
+    product cache so they are looked up again.
     """
-    if tool.name == "search_shop_catalog":
+    if tool.name in CATALOG_SEARCH_TOOLS:
         search_shop_catalog_response = tool_response["content"][0]["text"]
         parsed_response = json.loads(search_shop_catalog_response)
 
-        new_products = parsed_response.get("products", [])
+        shaped_response = await cache_search_results(
+            tool.name, parsed_response, tool_context
+        )
+
+        content = list(tool_response["content"])
+        content[0] = dict(content[0], text=json.dumps(shaped_response))
+
+        return dict(tool_response, content=content)
+
+    if tool.name == "update_cart" and is_failed_cart_update(tool_response):
+        # Most likely a variant sold out or changed since it was cached
+        product_ids = product_cache.invalidate_variants(find_variant_ids(args))
+        if product_ids:
+            logger.info("Cart update failed, dropped cached products %s", product_ids)
+
+    return None
+
+
+def is_failed_cart_update(tool_response: Dict) -> bool:
+    if tool_response.get("isError"):
+        return True
+
+    for item in tool_response.get("content") or []:
+        try:
+            parsed = json.loads(item.get("text") or "")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(parsed, dict) and any(parsed.get(k) for k in CART_ERROR_KEYS):
+            return True
+
+    return False
+
+
+def find_variant_ids(value: Any) -> List[str]:
+    """Every product variant GID in a tool's arguments, however they are nested."""
+    if isinstance(value, str):
+        return [value] if value.startswith("gid://shopify/ProductVariant/") else []
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return [variant_id for v in value for variant_id in find_variant_ids(v)]
+    return []
+
+
+async def cache_search_results(
+    tool_name: str, parsed_response: Dict, tool_context: ToolContext
+) -> Dict:
+    """
+    Resolves the variants of catalog search results, caches them in the product cache and the session, and returns the
+    search response shaped to TOOL_RESPONSE_TOKEN_BUDGET tokens.
+    """
+    new_products = parsed_response.get("products", [])
 
-        for product in new_products:
+    # Start the lookups for variants missing or too old in the product cache first, so they overlap with the processing
+    variants_by_product = {}
+    for product in new_products:
+        if product.get("availabilityMatrix"):
             product_id = product.get("product_id")
+            variants_by_product[product_id] = product_cache.variants(product_id)
 
-            # Simplify existing variants if present
-            variants = product.get("variants")
-            if variants:
-                simplified_variants = []
-
-                for v in variants:
-                    simplified_variant = {
-                        "variant_id": v.get("variant_id"),
-                        "title": v.get("title"),
-                        "price": v.get("price"),
-                        "available": v.get("available"),
-                    }
-                    simplified_variants.append(simplified_variant)
-                product["variants"] = simplified_variants
-
-            # Turn availabilityMatrix into variants if present
-            availabilityMatrix = product.get("availabilityMatrix")
-            if availabilityMatrix:
-                request_url = f"{SHOPIFY_DOMAIN}/admin/api/2024-10/graphql.json"
-
-                query = f"""
-                {{
-                    product(id: "{product_id}") {{
-                        variants(first: 100) {{
-                            edges {{
-                                node {{
-                                    id
-                                    title
-                                    price
-                                    availableForSale
-                                }}
-                            }}
-                        }}
-                    }}
-                }}
-                """
-
-                response = requests.post(
-                    request_url,
-                    headers={
-                        "Content-Type": "application/json",
-                        "X-Shopify-Access-Token": SHOPIFY_ADMIN_TOKEN,
-                    },
-                    json={"query": query},
-                )
-
-                data = response.json()
-
-                edges = (
-                    data.get("data", {})
-                    .get("product", {})
-                    .get("variants", {})
-                    .get("edges", [])
-                )
-
-                updated_variants = []
-                for e in edges:
-                    variant = e.get("node")
-                    if variant:
-                        updated_variants.append(
-                            {
-                                "variant_id": variant.get("id"),
-                                "title": variant.get("title"),
-                                "price": variant.get("price"),
-                                "available": variant.get("availableForSale"),
-                            }
-                        )
-
-                product["variants"] = updated_variants
-                product.pop("availabilityMatrix")
-
-        # Cache updated products without duplicates
-        cached_products = tool_context.state.get("cached_products", [])
-
-        combined_products = {p["product_id"]: p for p in cached_products + new_products}
-
-        tool_context.state["cached_products"] = list(combined_products.values())
-
-        return None
-
-
-def get_cached_products(product_name: str, tool_context: ToolContext) -> dict:
+    variant_lookups = lookup_product_variants(
+        [p for p, variants in variants_by_product.items() if variants is None]
+    )
+
+    for product in new_products:
+        # Simplify existing variants if present
+        variants = product.get("variants")
+        if variants:
+            simplified_variants = []
+
+            for v in variants:
+                simplified_variant = {
+                    "variant_id": v.get("variant_id"),
+                    "title": v.get("title"),
+                    "price": v.get("price"),
+                    "available": v.get("available"),
+                }
+                simplified_variants.append(simplified_variant)
+            product["variants"] = simplified_variants
+
+    # Turn availabilityMatrix into variants if present
+    for result in await asyncio.gather(*variant_lookups, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error("Variant lookup failed: %s", result)
+            continue
+        variants_by_product.update(result)
+
+    for product in new_products:
+        product_id = product.get("product_id")
+
+        if product.get("availabilityMatrix") and variants_by_product.get(product_id):
+            product["variants"] = variants_by_product[product_id]
+            product.pop("availabilityMatrix")
+
+        product_cache.put(product)
+
+    # Cache updated products in the session, writing only what changed
+    SessionProducts(tool_context.state, SESSION_PRODUCT_LIMIT).put_many(new_products)
+
+    return shape_response(
+        tool_name,
+        dict(parsed_response, products=new_products),
+        TOOL_RESPONSE_TOKEN_BUDGET,
+    )
+
+
+def get_cached_products(
+    product_name: str,
+    tool_context: ToolContext,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    available_only: bool = False,
+) -> dict:
     """
     Retrieve products from the cached product list that match a given product name.
 
-    This tool checks whether relevant products have already been fetched from the Shopify catalog in the current session before making a new `search_shop_catalog` tool call.
+    This tool checks whether relevant products have already been fetched from the Shopify catalog, in this or any other session, before making a new `search_shop_catalog` tool call.
+    Matching tolerates plurals, word order and small typos, and the best matches come first.
 
     Args:
         product_name (str): The product name or keyword to search for
+        min_price (float): Optional lowest price to include
+        max_price (float): Optional highest price to include
+        available_only (bool): Only include products with a variant available for sale
     """
-    cached_products = tool_context.state.get("cached_products", [])
+    session_products = SessionProducts(tool_context.state, SESSION_PRODUCT_LIMIT)
 
-    if not cached_products:
-        return {
+    # Products this session cached before they were evicted from (or this process never saw them in) the product cache
+    for product in session_products.all():
+        if not product_cache.contains(product.get("product_id")):
+            product_cache.put(product, current=False)
+
+    relevant_products = [
+        compact_product(p)
+        for p in product_cache.search(
+            product_name, min_price, max_price, available_only
+        )
+    ]
+
+    session_products.touch([p.get("product_id") for p in relevant_products])
+
+    return shape_response(
+        "get_cached_products",
+        {
             "status": "success",
-            "product_count": 0,
-            "products": [],
-        }
+            "product_count": len(relevant_products),
+            "products": relevant_products,
+        },
+        TOOL_RESPONSE_TOKEN_BUDGET,
+    )
 
-    product_name_lowercase = product_name.lower().strip()
-    relevant_products = []
 
-    for product in cached_products:
-        product_title_lowercase = product.get("title", "").lower().strip()
+def get_product_details(product_id: str, tool_context: ToolContext) -> dict:
+    """
+    Retrieve the full details of a cached product, including its complete description and every variant.
+
+    Product lists from the "search_shop_catalog" and "get_cached_products" tools are shortened; use this tool when the detail they left out is needed.
+
+    Args:
+        product_id (str): The product_id of the product
+    """
+    product = product_cache.get(product_id) or SessionProducts(
+        tool_context.state, SESSION_PRODUCT_LIMIT
+    ).get(product_id)
 
-        if product_name_lowercase in product_title_lowercase:
-            relevant_products.append(product)
+    if not product:
+        return {
+            "status": "error",
+            "message": f"Product {product_id} is not cached, use the search_shop_catalog tool to find it",
+        }
 
     return {
         "status": "success",
-        "product_count": len(relevant_products),
-        "products": relevant_products,
+        "product": product,
+    }
+
+
+async def search_local_catalog(
+    query: str,
+    limit: int = 3,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    available_only: bool = False,
+) -> dict:
+    """
+    Search the store catalog from a local copy, returning the same products as the `search_shop_catalog` tool without a network round trip.
+
+    The result has the same shape as the `search_shop_catalog` tool's. If no products are returned (for instance while the local copy is still loading), use the `search_shop_catalog` tool instead.
+
+    Args:
+        query (str): The product name or keywords to search for
+        limit (int): The maximum number of products to return
+        min_price (float): Optional lowest price to include
+        max_price (float): Optional highest price to include
+        available_only (bool): Only include products with a variant available for sale
+    """
+    catalog.maybe_start()
+
+    if not catalog.ready:
+        result = {
+            "products": [],
+            "message": "The local catalog is still loading, use the search_shop_catalog tool",
+        }
+    else:
+        result = {
+            "products": catalog.mirror.search(
+                query, limit, min_price, max_price, available_only
+            )
+        }
+
+    # The MCP tool result envelope, so the widget and the server handle both search tools alike
+    return {
+        "content": [{"type": "text", "text": json.dumps(result)}],
+        "isError": False,
     }
 
 
@@ -231,7 +409,9 @@ root_agent = Agent(
             tool_filter=["search_shop_catalog", "get_cart", "update_cart"],
             errlog=None,
         ),
+        search_local_catalog,
         get_cached_products,
+        get_product_details,
         set_gender_preference,
     ],
     output_schema=AgentOutput,
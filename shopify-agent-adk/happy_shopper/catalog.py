@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from happy_shopper.shopify import PRODUCTS_PER_QUERY
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PRODUCTS_QUERY = """
+query CatalogProducts($first: Int!, $after: String, $query: String) {
+    products(first: $first, after: $after, query: $query, sortKey: UPDATED_AT) {
+        pageInfo {
+            hasNextPage
+            endCursor
+        }
+        edges {
+            node {
+                id
+                title
+                description
+                handle
+                onlineStoreUrl
+                productType
+                tags
+                status
+                updatedAt
+                featuredImage {
+                    url
+                }
+                priceRangeV2 {
+                    minVariantPrice {
+                        amount
+                        currencyCode
+                    }
+                    maxVariantPrice {
+                        amount
+                    }
+                }
+                variants(first: 100) {
+                    edges {
+                        node {
+                            id
+                            title
+                            price
+                            availableForSale
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL,
+    price_min REAL,
+    price_max REAL,
+    available INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    title,
+    product_type,
+    tags,
+    variant_titles,
+    description,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# bm25 weights for title, product_type, tags, variant_titles and description
+BM25_WEIGHTS = "10.0, 4.0, 3.0, 2.0, 1.0"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def node_to_product(node: Dict, shop_domain: str = "") -> Dict:
+    """Converts an Admin API product node to the product shape of the `search_shop_catalog` MCP tool."""
+    price_range = node.get("priceRangeV2") or {}
+    min_price = price_range.get("minVariantPrice") or {}
+    max_price = price_range.get("maxVariantPrice") or {}
+    currency = min_price.get("currencyCode")
+
+    url = node.get("onlineStoreUrl")
+    if not url and node.get("handle"):
+        url = f"{shop_domain}/products/{node['handle']}"
+
+    return {
+        "product_id": node.get("id"),
+        "title": node.get("title"),
+        "description": node.get("description"),
+        "url": url,
+        "image_url": (node.get("featuredImage") or {}).get("url"),
+        "price_range": {
+            "min": min_price.get("amount"),
+            "max": max_price.get("amount"),
+            "currency": currency,
+        },
+        "product_type": node.get("productType"),
+        "tags": node.get("tags") or [],
+        "variants": [
+            {
+                "variant_id": variant.get("id"),
+                "title": variant.get("title"),
+                "price": variant.get("price"),
+                "currency": currency,
+                "available": variant.get("availableForSale"),
+            }
+            for variant in (
+                e.get("node") for e in (node.get("variants") or {}).get("edges", [])
+            )
+            if variant
+        ],
+        "updated_at": node.get("updatedAt"),
+    }
+
+
+def to_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def match_expression(query: str) -> str:
+    """An FTS5 query matching any of the query's words, as a prefix."""
+    words = TOKEN_PATTERN.findall(query.lower())
+    return " OR ".join(f'"{word}"*' for word in words)
+
+
+class CatalogMirror:
+    """
+    Local copy of the store catalog in SQLite with a full-text index, answering product searches without a network
+    round trip.
+
+    Products are stored in the `search_shop_catalog` result shape, so search results can be used interchangeably with
+    the MCP tool's. `sync` brings the mirror up to date from the Admin API; `import_dump` and `export_dump` load and
+    record a JSON catalog dump, e.g. to test offline.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM products").fetchone()[
+                0
+            ]
+
+    def upsert(self, products: Iterable[Dict]) -> int:
+        rows = []
+
+        for product in products:
+            product_id = product.get("product_id")
+            if not product_id:
+                continue
+
+            variants = product.get("variants") or []
+            prices = [
+                p for p in (to_float(v.get("price")) for v in variants) if p is not None
+            ]
+            price_range = product.get("price_range") or {}
+
+            rows.append(
+                (
+                    product_id,
+                    product.get("updated_at") or "",
+                    min(prices) if prices else to_float(price_range.get("min")),
+                    max(prices) if prices else to_float(price_range.get("max")),
+                    int(any(v.get("available") for v in variants)),
+                    json.dumps(product),
+                    product.get("title") or "",
+                    product.get("product_type") or "",
+                    " ".join(product.get("tags") or []),
+                    " ".join(v.get("title") or "" for v in variants),
+                    product.get("description") or "",
+                )
+            )
+
+        with self.lock, self.connection:
+            for row in rows:
+                # The full-text row shares its rowid with the product row
+                self.delete_row(row[0])
+                rowid = self.connection.execute(
+                    "INSERT INTO products VALUES (?, ?, ?, ?, ?, ?)", row[:6]
+                ).lastrowid
+                self.connection.execute(
+                    "INSERT INTO products_fts(rowid, title, product_type, tags, "
+                    "variant_titles, description) VALUES (?, ?, ?, ?, ?, ?)",
+                    (rowid,) + row[6:],
+                )
+
+        return len(rows)
+
+    def delete(self, product_ids: Iterable[str]) -> None:
+        with self.lock, self.connection:
+            for product_id in product_ids:
+                self.delete_row(product_id)
+
+    def delete_row(self, product_id: str) -> None:
+        row = self.connection.execute(
+            "SELECT rowid FROM products WHERE product_id = ?", (product_id,)
+        ).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM products_fts WHERE rowid = ?", row)
+            self.connection.execute("DELETE FROM products WHERE rowid = ?", row)
+
+    def product_ids(self) -> List[str]:
+        with self.lock:
+            return [
+                row[0]
+                for row in self.connection.execute("SELECT product_id FROM products")
+            ]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 3,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        available_only: bool = False,
+    ) -> List[Dict]:
+        """Products matching any word of `query` (by prefix), ranked by BM25 with title matches counting most."""
+        expression = match_expression(query)
+        conditions, params = [], []
+
+        if min_price is not None:
+            conditions.append("p.price_max >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("p.price_min <= ?")
+            params.append(max_price)
+        if available_only:
+            conditions.append("p.available = 1")
+
+        if expression:
+            sql = (
+                "SELECT p.data FROM products_fts f JOIN products p ON p.rowid = f.rowid "
+                "WHERE products_fts MATCH ?"
+                + "".join(f" AND {c}" for c in conditions)
+                + f" ORDER BY bm25(products_fts, {BM25_WEIGHTS}) LIMIT ?"
+            )
+            params = [expression] + params
+        else:
+            sql = (
+                "SELECT p.data FROM products p"
+                + (" WHERE " + " AND ".join(conditions) if conditions else "")
+                + " ORDER BY p.updated_at DESC LIMIT ?"
+            )
+
+        with self.lock:
+            rows = self.connection.execute(sql, params + [limit]).fetchall()
+
+        return [json.loads(row[0]) for row in rows]
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM sync_state WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, value)
+            )
+
+    def import_dump(self, path: str) -> int:
+        """Loads a catalog dump written by `export_dump` (or a JSON list of products)."""
+        with open(path) as f:
+            dump = json.load(f)
+
+        products = dump["products"] if isinstance(dump, dict) else dump
+        count = self.upsert(products)
+
+        if isinstance(dump, dict) and dump.get("updated_at"):
+            self.set_state("updated_at", dump["updated_at"])
+
+        return count
+
+    def export_dump(self, path: str) -> int:
+        with self.lock:
+            products = [
+                json.loads(row[0])
+                for row in self.connection.execute("SELECT data FROM products")
+            ]
+
+        with open(path, "w") as f:
+            json.dump(
+                {"updated_at": self.get_state("updated_at"), "products": products}, f
+            )
+
+        return len(products)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self),
+            "updatedAt": self.get_state("updated_at"),
+            "syncedAt": self.get_state("synced_at"),
+        }
+
+
+async def sync(
+    mirror: CatalogMirror, admin: Any, shop_domain: str = "", full: bool = False
+) -> int:
+    """
+    Brings the mirror up to date from the Admin API and returns the number of products written.
+
+    An incremental sync only fetches products updated since the last sync and drops those no longer active. A full
+    sync fetches every product and also drops products deleted from the store.
+    """
+    started = time.perf_counter()
+    since = None if full else mirror.get_state("updated_at")
+    search = f"updated_at:>='{since}'" if since else None
+
+    seen, written, cursor = set(), 0, None
+    latest = since or ""
+
+    while True:
+        data = await admin.agraphql(
+            CATALOG_PRODUCTS_QUERY,
+            {"first": PRODUCTS_PER_QUERY, "after": cursor, "query": search},
+        )
+        page = data.get("products") or {}
+        nodes = [e["node"] for e in page.get("edges", []) if e.get("node")]
+
+        active = [n for n in nodes if n.get("status", "ACTIVE") == "ACTIVE"]
+        mirror.delete(n["id"] for n in nodes if n.get("status", "ACTIVE") != "ACTIVE")
+        written += mirror.upsert(node_to_product(n, shop_domain) for n in active)
+
+        seen.update(n["id"] for n in nodes)
+        latest = max([latest] + [n.get("updatedAt") or "" for n in nodes])
+
+        page_info = page.get("pageInfo") or {}
+        if not page_info.get("hasNextPage"):
+            break
+        cursor = page_info.get("endCursor")
+
+    if full:
+        mirror.delete([p for p in mirror.product_ids() if p not in seen])
+
+    if latest:
+        mirror.set_state("updated_at", latest)
+    mirror.set_state("synced_at", datetime.now(timezone.utc).isoformat())
+
+    logger.info(
+        "Catalog %s sync wrote %d products in %.2fs",
+        "full" if full else "incremental",
+        written,
+        time.perf_counter() - started,
+    )
+    return written
+
+
+class CatalogSync:
+    """
+    Keeps a `CatalogMirror` fresh in the background: a full sync first and every `full_interval` seconds, and
+    incremental syncs when the mirror is older than `interval` seconds. `maybe_start` never blocks its caller.
+    """
+
+    def __init__(
+        self,
+        mirror: CatalogMirror,
+        admin: Any,
+        shop_domain: str = "",
+        interval: float = 300,
+        full_interval: float = 86400,
+    ):
+        self.mirror = mirror
+        self.admin = admin
+        self.shop_domain = shop_domain
+        self.interval = interval
+        self.full_interval = full_interval
+        self.last_sync = 0.0
+        self.last_full_sync = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, admin: Any, shop_domain: str = "") -> "CatalogSync":
+        mirror = CatalogMirror(os.getenv("CATALOG_DB_PATH", ":memory:"))
+
+        dump_path = os.getenv("CATALOG_DUMP_PATH")
+        if dump_path and not len(mirror):
+            logger.info(
+                "Imported %d products from %s", mirror.import_dump(dump_path), dump_path
+            )
+
+        return cls(
+            mirror,
+            admin,
+            shop_domain=shop_domain,
+            interval=float(os.getenv("CATALOG_SYNC_INTERVAL", "300")),
+            full_interval=float(os.getenv("CATALOG_FULL_SYNC_INTERVAL", "86400")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return len(self.mirror) > 0
+
+    def maybe_start(self) -> None:
+        if self.interval <= 0 or (self.task is not None and not self.task.done()):
+            return
+
+        now = time.monotonic()
+        if self.last_sync and now - self.last_sync < self.interval:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        full = (
+            not self.last_full_sync or now - self.last_full_sync >= self.full_interval
+        )
+        self.task = loop.create_task(self.run(full))
+
+    async def run(self, full: bool) -> None:
+        started = time.monotonic()
+
+        try:
+            await sync(self.mirror, self.admin, self.shop_domain, full=full)
+            if full:
+                self.last_full_sync = started
+        except Exception as e:
+            # Searches keep using the mirror as it is, or fall back to the MCP tool while it is empty
+            logger.error("Catalog sync failed: %s", e)
+        finally:
+            self.last_sync = started
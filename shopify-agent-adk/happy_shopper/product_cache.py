@@ -0,0 +1,271 @@
+import asyncio
+import copy
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from happy_shopper.product_index import ProductIndex
+from happy_shopper.shopify import PRODUCTS_PER_QUERY
+
+logger = logging.getLogger(__name__)
+
+
+class CachedProduct:
+    __slots__ = ("product", "size", "stored_at", "variants_at")
+
+    def __init__(self, product: Dict, size: int, stored_at: float, variants_at: float):
+        self.product = product
+        self.size = size
+        self.stored_at = stored_at
+        self.variants_at = variants_at
+
+
+class ProductCache:
+    """
+    Process-wide product cache keyed by product_id, shared by every session served by this process.
+
+    Entries expire `ttl` seconds after they were stored, and the least recently used ones are evicted beyond
+    `max_entries` or `max_bytes` (of JSON). Reading an entry older than `refresh_after` refreshes its variants in the
+    background through `refresh`, which takes product IDs and returns their variants keyed by product ID. Storing a
+    product whose variant prices or availability differ from the cached copy invalidates the cached copy.
+
+    Resolved variants are only reused in place of a fresh lookup (`variants`) for `variants_max_age` seconds, since
+    availability changes faster than the rest of a product. `invalidate_variants` drops the products a failed cart
+    update points at.
+
+    Cached products are kept in a `ProductIndex` for `search`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 900,
+        max_entries: int = 2000,
+        max_bytes: int = 16 * 1024 * 1024,
+        refresh_after: Optional[float] = None,
+        refresh: Optional[Callable[[List[str]], Awaitable[Dict[str, List]]]] = None,
+        refresh_batch: int = PRODUCTS_PER_QUERY,
+        variants_max_age: float = 60,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.refresh_after = refresh_after if refresh_after is not None else ttl * 0.8
+        self.refresh = refresh
+        self.refresh_batch = refresh_batch
+        self.variants_max_age = variants_max_age
+        self.entries: "OrderedDict[str, CachedProduct]" = OrderedDict()
+        self.index = ProductIndex()
+        self.size = 0
+        self.refreshing: Set[str] = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(
+        cls,
+        refresh: Optional[Callable[[List[str]], Awaitable[Dict[str, List]]]] = None,
+    ) -> "ProductCache":
+        return cls(
+            ttl=float(os.getenv("PRODUCT_CACHE_TTL", "900")),
+            max_entries=int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "2000")),
+            max_bytes=int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            variants_max_age=float(os.getenv("PRODUCT_VARIANTS_MAX_AGE", "60")),
+            refresh=refresh,
+        )
+
+    def get(self, product_id: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.live_entry(product_id)
+            if entry is None:
+                return None
+
+            self.entries.move_to_end(product_id)
+            stale = time.monotonic() - entry.stored_at >= self.refresh_after
+            product = copy.deepcopy(entry.product)
+
+        if stale:
+            self.schedule_refresh([product_id])
+
+        return product
+
+    def variants(self, product_id: str) -> Optional[List[Dict]]:
+        """
+        The product's resolved variants, or None if it is not cached, only has an availabilityMatrix or its variants
+        were resolved more than `variants_max_age` seconds ago.
+        """
+        with self.lock:
+            entry = self.live_entry(product_id)
+            if (
+                entry is None
+                or entry.product.get("availabilityMatrix")
+                or time.monotonic() - entry.variants_at >= self.variants_max_age
+            ):
+                return None
+
+            self.entries.move_to_end(product_id)
+            return copy.deepcopy(entry.product.get("variants"))
+
+    def contains(self, product_id: str) -> bool:
+        with self.lock:
+            return self.live_entry(product_id) is not None
+
+    def search(
+        self,
+        query: str,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        available_only: bool = False,
+    ) -> List[Dict]:
+        """Cached products matching `query` and the filters, best match first (see `ProductIndex.search`)."""
+        with self.lock:
+            matches = self.index.search(query, min_price, max_price, available_only)
+
+        return [p for p in (self.get(product_id) for product_id in matches) if p]
+
+    def put(self, product: Dict, current: bool = True) -> None:
+        """
+        Caches a product. Pass `current=False` for copies of unknown age (e.g. from session state): their variants are
+        never reused in place of a lookup.
+        """
+        product_id = product.get("product_id")
+        if not product_id:
+            return
+
+        product = copy.deepcopy(product)
+        variants_at = None if current else -math.inf
+
+        with self.lock:
+            previous = self.entries.get(product_id)
+            if previous is not None:
+                if product.get("availabilityMatrix") and not previous.product.get(
+                    "availabilityMatrix"
+                ):
+                    # The variant lookup failed; keep the variants already resolved, as old as they are
+                    product.pop("availabilityMatrix")
+                    product["variants"] = previous.product.get("variants")
+                    variants_at = previous.variants_at
+                elif variants_changed(previous.product, product):
+                    logger.info("Product %s changed, replacing cached copy", product_id)
+
+            self.store(product_id, product, variants_at)
+
+    def put_variants(self, product_id: str, variants: List[Dict]) -> None:
+        with self.lock:
+            entry = self.entries.get(product_id)
+            if entry is None:
+                return
+
+            product = dict(entry.product, variants=copy.deepcopy(variants))
+            product.pop("availabilityMatrix", None)
+
+            if variants_changed(entry.product, product):
+                logger.info("Product %s variants changed", product_id)
+
+            self.store(product_id, product)
+
+    def invalidate_variants(self, variant_ids: Iterable[str]) -> List[str]:
+        """Drops the products owning any of `variant_ids`, e.g. after a cart update with them failed. Returns their IDs."""
+        variant_ids = set(variant_ids)
+
+        with self.lock:
+            product_ids = [
+                product_id
+                for product_id, entry in self.entries.items()
+                if any(
+                    v.get("variant_id") in variant_ids
+                    for v in entry.product.get("variants") or []
+                )
+            ]
+            for product_id in product_ids:
+                self.drop(product_id)
+
+        return product_ids
+
+    def drop(self, product_id: str) -> None:
+        entry = self.entries.pop(product_id, None)
+        if entry is not None:
+            self.size -= entry.size
+            self.index.remove(product_id)
+
+    def store(
+        self, product_id: str, product: Dict, variants_at: Optional[float] = None
+    ) -> None:
+        previous = self.entries.pop(product_id, None)
+        if previous is not None:
+            self.size -= previous.size
+
+        now = time.monotonic()
+        size = len(json.dumps(product, separators=(",", ":")))
+        self.entries[product_id] = CachedProduct(
+            product, size, now, variants_at if variants_at is not None else now
+        )
+        self.size += size
+        self.index.add(product_id, product)
+
+        while self.entries and (
+            len(self.entries) > self.max_entries or self.size > self.max_bytes
+        ):
+            evicted_id, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.index.remove(evicted_id)
+
+    def live_entry(self, product_id: str) -> Optional[CachedProduct]:
+        entry = self.entries.get(product_id)
+        if entry is None:
+            return None
+
+        if time.monotonic() - entry.stored_at >= self.ttl:
+            del self.entries[product_id]
+            self.size -= entry.size
+            self.index.remove(product_id)
+            return None
+
+        return entry
+
+    def schedule_refresh(self, product_ids: List[str]) -> None:
+        if self.refresh is None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        with self.lock:
+            due = [p for p in product_ids if p not in self.refreshing]
+            self.refreshing.update(due)
+
+        for i in range(0, len(due), self.refresh_batch):
+            loop.create_task(self.refresh_variants(due[i : i + self.refresh_batch]))
+
+    async def refresh_variants(self, product_ids: List[str]) -> None:
+        try:
+            variants_by_product = await self.refresh(product_ids)
+            for product_id, variants in variants_by_product.items():
+                self.put_variants(product_id, variants)
+        except Exception as e:
+            # The cached copy keeps serving until it expires
+            logger.warning("Product refresh failed: %s", e)
+        finally:
+            with self.lock:
+                self.refreshing.difference_update(product_ids)
+
+
+def variants_changed(old: Dict, new: Dict) -> bool:
+    """Whether any variant price or availability differs; unknown variants on either side do not count."""
+    old_variants = {v.get("variant_id"): v for v in old.get("variants") or []}
+
+    for variant in new.get("variants") or []:
+        previous = old_variants.get(variant.get("variant_id"))
+        if previous is None:
+            continue
+        if previous.get("price") != variant.get("price") or previous.get(
+            "available"
+        ) != variant.get("available"):
+            return True
+
+    return False
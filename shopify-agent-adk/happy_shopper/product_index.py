@@ -0,0 +1,237 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+FIELD_WEIGHTS = {"title": 3.0, "product_type": 2.0, "tags": 1.5, "variants": 1.0}
+EXACT, PREFIX, TYPO = 1.0, 0.7, 0.6
+STOP_WORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to", "with"}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+VOWELS = set("aeiou")
+
+
+def normalize(token: str) -> str:
+    """
+    Folds common English plurals onto their singular, so 'jackets' and 'jacket' index the same.
+
+    A plural in 'ies' may come from a singular in 'y' ('berries') or in 'ie' ('hoodies'), so both fold onto 'ie'.
+    """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-1]
+    if len(token) > 2 and token.endswith("y") and token[-2] not in VOWELS:
+        return token[:-1] + "ie"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        normalize(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Whether a and b are at most `limit` edits apart, counting a swap of adjacent letters as one edit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            distance = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)
+            )
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+
+    return previous[-1] <= limit
+
+
+def product_fields(product: Dict) -> Dict[str, str]:
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+
+    return {
+        "title": product.get("title") or "",
+        "product_type": product.get("product_type") or "",
+        "tags": " ".join(tags),
+        "variants": " ".join(
+            v.get("title") or "" for v in product.get("variants") or []
+        ),
+    }
+
+
+def product_prices(product: Dict, available_only: bool) -> List[float]:
+    prices = []
+
+    for variant in product.get("variants") or []:
+        if available_only and not variant.get("available"):
+            continue
+        try:
+            prices.append(float(variant.get("price")))
+        except (TypeError, ValueError):
+            continue
+
+    if prices or available_only:
+        return prices
+
+    price_range = product.get("price_range") or {}
+    for key in ("min", "max"):
+        try:
+            prices.append(float(price_range.get(key)))
+        except (TypeError, ValueError):
+            continue
+    return prices
+
+
+def matches_filters(
+    product: Dict,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    available_only: bool,
+) -> bool:
+    variants = product.get("variants") or []
+    if available_only and not any(v.get("available") for v in variants):
+        return False
+
+    if min_price is None and max_price is None:
+        return True
+
+    return any(
+        (min_price is None or price >= min_price)
+        and (max_price is None or price <= max_price)
+        for price in product_prices(product, available_only)
+    )
+
+
+class ProductIndex:
+    """
+    Inverted token index over product titles, product types, tags and variant titles, updated one product at a time.
+
+    `search` ranks products by the field weight and rarity (idf) of the matched tokens. A query token that is not in
+    the index matches indexed tokens it is a prefix of, or that are within one typo (two for long tokens).
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.product_tokens: Dict[str, Set[str]] = {}
+        self.products: Dict[str, Dict] = {}
+
+    def add(self, product_id: str, product: Dict) -> None:
+        self.remove(product_id)
+
+        weights: Dict[str, float] = {}
+        for field, text in product_fields(product).items():
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0.0), FIELD_WEIGHTS[field])
+
+        for token, weight in weights.items():
+            self.postings[token][product_id] = weight
+
+        self.product_tokens[product_id] = set(weights)
+        self.products[product_id] = product
+
+    def remove(self, product_id: str) -> None:
+        for token in self.product_tokens.pop(product_id, ()):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self.postings[token]
+
+        self.products.pop(product_id, None)
+
+    def expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed tokens matching a query token, with how closely they match."""
+        if token in self.postings:
+            return [(token, EXACT)]
+
+        limit = 2 if len(token) >= 8 else 1 if len(token) >= 4 else 0
+        matches = []
+
+        for candidate in self.postings:
+            if len(token) >= 3 and candidate.startswith(token):
+                matches.append((candidate, PREFIX))
+            elif limit and within_distance(token, candidate, limit):
+                matches.append((candidate, TYPO))
+
+        return matches
+
+    def search(
+        self,
+        query: str,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        available_only: bool = False,
+        candidates: Optional[Iterable[str]] = None,
+    ) -> List[str]:
+        """
+        Product IDs matching at least half of the query's tokens (all products for an empty query, none for a query of
+        only stop words), best first.
+
+        Products must have a price within [min_price, max_price] and, with `available_only`, an available variant.
+        `candidates` restricts the search to those product IDs.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+
+        # Only stop words (or single letters): nothing to match on
+        if not tokens and TOKEN_PATTERN.search(query.lower()):
+            return []
+
+        allowed = set(candidates) if candidates is not None else None
+        scores: Dict[str, float] = defaultdict(float)
+        matched: Dict[str, int] = defaultdict(int)
+
+        if not tokens:
+            pool = allowed if allowed is not None else set(self.products)
+            scores.update({product_id: 0.0 for product_id in pool})
+        else:
+            total = len(self.products) or 1
+
+            for token in tokens:
+                best: Dict[str, float] = {}
+                for candidate, closeness in self.expand(token):
+                    postings = self.postings[candidate]
+                    idf = math.log(1 + total / len(postings))
+                    for product_id, weight in postings.items():
+                        score = closeness * weight * idf
+                        if score > best.get(product_id, 0.0):
+                            best[product_id] = score
+
+                for product_id, score in best.items():
+                    scores[product_id] += score
+                    matched[product_id] += 1
+
+        required = math.ceil(len(tokens) / 2)
+        results = []
+
+        for product_id, score in scores.items():
+            if allowed is not None and product_id not in allowed:
+                continue
+            if matched[product_id] < required:
+                continue
+
+            product = self.products.get(product_id)
+            if product is None:
+                continue
+
+            if not matches_filters(product, min_price, max_price, available_only):
+                continue
+
+            results.append((score, product_id))
+
+        results.sort(key=lambda item: -item[0])
+        return [product_id for _, product_id in results]
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+SLOT_KEY_PREFIX = "cached_product_slot:"
+INDEX_KEY = "cached_product_slots"
+LEGACY_KEY = "cached_products"
+
+PRODUCT_FIELDS = (
+    "product_id",
+    "title",
+    "description",
+    "url",
+    "price_range",
+    "product_type",
+    "tags",
+    "variants",
+)
+VARIANT_FIELDS = ("variant_id", "title", "price", "available")
+MAX_DESCRIPTION_CHARS = 400
+
+
+class SessionProducts:
+    """
+    The products cached in a session's state, one state key per slot plus a small index of (product ID, slot) pairs in
+    least recently used order.
+
+    Session state is persisted as per-event deltas, so a search only writes the products it added or changed (and the
+    index) instead of the whole collection. Beyond `max_products` the least recently used product is evicted and its
+    slot reused, so a session never holds more than `max_products` product keys.
+    """
+
+    def __init__(self, state: Any, max_products: int = 50):
+        self.state = state
+        self.max_products = max_products
+
+        legacy_products = state.get(LEGACY_KEY)
+        if legacy_products:
+            self.put_many(legacy_products)
+            # Session state has no deletes; a null value drops the key
+            state[LEGACY_KEY] = None
+
+    def slots(self) -> "OrderedDict[str, int]":
+        return OrderedDict(
+            (product_id, slot) for product_id, slot in self.state.get(INDEX_KEY) or []
+        )
+
+    def ids(self) -> List[str]:
+        return list(self.slots())
+
+    def get(self, product_id: str) -> Optional[Dict]:
+        slot = self.slots().get(product_id)
+        if slot is None:
+            return None
+
+        product = self.state.get(SLOT_KEY_PREFIX + str(slot))
+        if not product or product.get("product_id") != product_id:
+            return None
+        return product
+
+    def all(self) -> List[Dict]:
+        """Cached products, most recently used first."""
+        return [p for p in (self.get(i) for i in reversed(self.ids())) if p]
+
+    def put_many(self, products: List[Dict]) -> None:
+        if self.max_products <= 0:
+            return
+
+        slots = self.slots()
+
+        for product in products:
+            product_id = product.get("product_id")
+            if not product_id:
+                continue
+
+            slot = slots.pop(product_id, None)
+            if slot is None:
+                slot = self.free_slot(slots)
+
+            compacted = compact_product(product)
+            key = SLOT_KEY_PREFIX + str(slot)
+            if self.state.get(key) != compacted:
+                self.state[key] = compacted
+
+            slots[product_id] = slot
+
+        self.write_index(slots)
+
+    def free_slot(self, slots: "OrderedDict[str, int]") -> int:
+        """A slot for a new product, evicting the least recently used products when all are taken."""
+        while slots and len(slots) >= self.max_products:
+            slots.popitem(last=False)
+
+        used = set(slots.values())
+        return next(slot for slot in range(self.max_products) if slot not in used)
+
+    def touch(self, product_ids: List[str]) -> None:
+        """Marks products as recently used, e.g. after a lookup returned them."""
+        slots = self.slots()
+        touched = [i for i in product_ids if i in slots]
+        if not touched or list(slots)[-len(touched) :] == touched:
+            return
+
+        for product_id in touched:
+            slots.move_to_end(product_id)
+
+        self.write_index(slots)
+
+    def write_index(self, slots: "OrderedDict[str, int]") -> None:
+        index = [[product_id, slot] for product_id, slot in slots.items()]
+        if index != [list(entry) for entry in self.state.get(INDEX_KEY) or []]:
+            self.state[INDEX_KEY] = index
+
+
+def compact_product(product: Dict) -> Dict:
+    """Keeps only the fields the agent's tools use, with a shortened description."""
+    compacted = {
+        field: product[field]
+        for field in PRODUCT_FIELDS
+        if product.get(field) not in (None, "", [])
+    }
+
+    description = compacted.get("description")
+    if description and len(description) > MAX_DESCRIPTION_CHARS:
+        compacted["description"] = (
+            description[:MAX_DESCRIPTION_CHARS].rsplit(" ", 1)[0] + "..."
+        )
+
+    if "variants" in compacted:
+        compacted["variants"] = [
+            {field: v.get(field) for field in VARIANT_FIELDS}
+            for v in compacted["variants"]
+        ]
+
+    return compacted
@@ -0,0 +1,127 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English and JSON with Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+DETAILS_HINT = (
+    "Use the get_product_details tool with a product_id for the full description "
+    "and every variant."
+)
+
+# Kept on every product: the storefront widget renders its product cards from these
+CARD_FIELDS = ("product_id", "title", "price_range", "image_url", "url")
+
+# Applied in order until the products fit the budget
+SHAPING_STEPS = [
+    {"description_chars": 200, "max_variants": None},
+    {"description_chars": 80, "max_variants": 12},
+    {"description_chars": 0, "max_variants": 6},
+]
+
+
+def estimate_tokens(value: Any) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, separators=(",", ":"))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def project_product(
+    product: Dict, description_chars: int, max_variants: Optional[int]
+) -> Dict:
+    """
+    Reduces a product to what the agent needs to recommend it and add it to a cart, and the widget needs to show it:
+    its card fields, a shortened description and the id, title and price of each available variant.
+    """
+    projected = {
+        field: product[field] for field in CARD_FIELDS if product.get(field) is not None
+    }
+
+    description = product.get("description")
+    if description and description_chars:
+        projected["description"] = truncate(description, description_chars)
+
+    variants = product.get("variants") or []
+    available = [
+        {
+            "variant_id": v.get("variant_id"),
+            "title": v.get("title"),
+            "price": v.get("price"),
+        }
+        for v in variants
+        if v.get("available")
+    ]
+
+    if len(variants) > len(available):
+        projected["unavailable_variant_count"] = len(variants) - len(available)
+
+    if max_variants is not None and len(available) > max_variants:
+        projected["more_available_variants"] = len(available) - max_variants
+        available = available[:max_variants]
+
+    projected["available_variants"] = available
+
+    return projected
+
+
+def shape_products(products: List[Dict], budget: int) -> Dict:
+    """
+    Projects products down until they fit `budget` tokens, shortening descriptions and then listing fewer variants.
+
+    Products are never dropped, since the widget renders every product of the response; past the budget, the remaining
+    products keep only their card fields (and are counted).
+    """
+    for step in SHAPING_STEPS:
+        shaped = [project_product(p, **step) for p in products]
+        if estimate_tokens(shaped) <= budget:
+            return {"products": shaped}
+
+    used = 0
+    for i, product in enumerate(shaped):
+        used += estimate_tokens(product)
+        if i and used > budget:
+            break
+    else:
+        return {"products": shaped}
+
+    card_only = [
+        dict(project_product(p, description_chars=0, max_variants=0), details=False)
+        for p in products[i:]
+    ]
+
+    return {
+        "products": shaped[:i] + card_only,
+        "products_without_details": len(card_only),
+    }
+
+
+def shape_response(tool_name: str, response: Dict, budget: int) -> Dict:
+    """
+    Shapes the `products` of a tool response to fit `budget` tokens, keeping its other fields, and logs the tokens
+    saved. Responses without products are returned unchanged.
+    """
+    products = response.get("products")
+    if not products:
+        return response
+
+    shaped = dict(response, **shape_products(products, budget))
+    shaped["details"] = DETAILS_HINT
+
+    before, after = estimate_tokens(response), estimate_tokens(shaped)
+    logger.info(
+        "Shaped %s response: %d -> %d tokens (%d saved)",
+        tool_name,
+        before,
+        after,
+        before - after,
+    )
+
+    return shaped
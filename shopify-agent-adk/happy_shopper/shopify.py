@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+ADMIN_API_VERSION = "2024-10"
+
+# Each product costs about 2 + 100 points (for variants(first: 100)) against the 1000-point single query limit
+PRODUCTS_PER_QUERY = 9
+
+logger = logging.getLogger(__name__)
+
+
+class ShopifyAdminError(Exception):
+    """An Admin API call failed: a transport error, a non-2xx response or GraphQL errors."""
+
+
+class AdminClient:
+    """
+    Shopify Admin GraphQL client sharing one keep-alive connection pool across tool calls, so only the first call pays
+    the TCP and TLS handshake.
+
+    The pool is bound to the event loop that opened it and reopened when `agraphql` is called from another one. Every
+    request is timed and logged.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        token: str,
+        api_version: str = ADMIN_API_VERSION,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+    ):
+        self.url = f"{domain}/admin/api/{api_version}/graphql.json"
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-Shopify-Access-Token": token,
+        }
+        self.timeout = httpx.Timeout(
+            read_timeout, connect=connect_timeout, pool=connect_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.async_client: Optional[httpx.AsyncClient] = None
+        self.async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def from_env(cls) -> "AdminClient":
+        return cls(
+            domain=os.getenv("SHOPIFY_DOMAIN", ""),
+            token=os.getenv("SHOPIFY_ADMIN_TOKEN", ""),
+            connect_timeout=float(os.getenv("SHOPIFY_ADMIN_CONNECT_TIMEOUT", "3")),
+            read_timeout=float(os.getenv("SHOPIFY_ADMIN_READ_TIMEOUT", "10")),
+            max_connections=int(os.getenv("SHOPIFY_ADMIN_MAX_CONNECTIONS", "10")),
+        )
+
+    def loop_client(self) -> httpx.AsyncClient:
+        # An async pool is bound to the event loop that opened its connections
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self.async_loop is not loop:
+            self.close_async_client()
+            self.async_client = httpx.AsyncClient(
+                headers=self.headers, timeout=self.timeout, limits=self.limits
+            )
+            self.async_loop = loop
+        return self.async_client
+
+    async def agraphql(
+        self, query: str, variables: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """Runs a GraphQL query and returns its `data`."""
+        started = time.perf_counter()
+        error = None
+
+        try:
+            response = await self.loop_client().post(
+                self.url, json={"query": query, "variables": variables or {}}
+            )
+            return self.data(response)
+        except Exception as e:
+            error = e
+            raise self.wrap(e) from e
+        finally:
+            self.record(time.perf_counter() - started, error)
+
+    @staticmethod
+    def data(response: httpx.Response) -> Dict:
+        response.raise_for_status()
+        body = response.json()
+
+        if body.get("errors"):
+            raise ShopifyAdminError(f"GraphQL errors: {body['errors']}")
+
+        return body.get("data") or {}
+
+    @staticmethod
+    def wrap(error: Exception) -> ShopifyAdminError:
+        if isinstance(error, ShopifyAdminError):
+            return error
+        return ShopifyAdminError(f"Admin API request failed: {error!r}")
+
+    def record(self, seconds: float, error: Optional[Exception]) -> None:
+        if error is not None:
+            logger.warning("Admin API request failed after %.3fs: %r", seconds, error)
+        else:
+            logger.debug("Admin API request took %.3fs", seconds)
+
+    def close_async_client(self) -> None:
+        """Closes the async pool on the event loop it belongs to, if that loop can still run it."""
+        client, loop = self.async_client, self.async_loop
+        self.async_client = self.async_loop = None
+
+        if client is None or loop is None or loop.is_closed():
+            # Its connections went down with their loop; the client is dropped for garbage collection
+            return
+
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+
+        if loop is current:
+            loop.create_task(client.aclose())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        elif current is None:
+            loop.run_until_complete(client.aclose())
+        else:
+            # A stopped loop cannot be run from inside another one
+            logger.debug("Dropping an async Admin API client without closing it")
+
+    def close(self) -> None:
+        self.close_async_client()
+
+
+admin: Optional[AdminClient] = None
+
+
+def admin_client() -> AdminClient:
+    """The process-wide client, built from the environment on first use (after `.env` is loaded)."""
+    global admin
+    if admin is None:
+        admin = AdminClient.from_env()
+    return admin
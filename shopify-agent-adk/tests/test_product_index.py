@@ -0,0 +1,57 @@
+import pytest
+
+from happy_shopper.product_index import ProductIndex, normalize
+
+PRODUCTS = {
+    "hoodie": {"title": "Night City Hoodie", "product_type": "Hoodie"},
+    "beanie": {"title": "Ribbed Beanie", "product_type": "Hat"},
+    "berry": {"title": "Berry Crewneck", "product_type": "Sweater"},
+    "tee": {"title": "Retro Wave Tee", "product_type": "T-Shirt"},
+    "jacket": {"title": "Denim Jacket", "product_type": "Jacket"},
+}
+
+
+@pytest.fixture
+def index():
+    index = ProductIndex()
+    for product_id, product in PRODUCTS.items():
+        index.add(product_id, product)
+    return index
+
+
+@pytest.mark.parametrize(
+    "plural, singular",
+    [
+        ("hoodies", "hoodie"),
+        ("beanies", "beanie"),
+        ("goodies", "goodie"),
+        ("berries", "berry"),
+        ("ties", "tie"),
+        ("jackets", "jacket"),
+        ("boxes", "box"),
+    ],
+)
+def test_plural_and_singular_normalize_alike(plural, singular):
+    assert normalize(plural) == normalize(singular)
+
+
+@pytest.mark.parametrize(
+    "query, product_id",
+    [
+        ("hoodies", "hoodie"),
+        ("beanies", "beanie"),
+        ("berries", "berry"),
+        ("jackets", "jacket"),
+        ("tees", "tee"),
+    ],
+)
+def test_plural_query_finds_singular_title(index, query, product_id):
+    assert index.search(query)[:1] == [product_id]
+
+
+def test_stop_word_query_matches_nothing(index):
+    assert index.search("the and of") == []
+
+
+def test_empty_query_matches_everything(index):
+    assert sorted(index.search("")) == sorted(PRODUCTS)
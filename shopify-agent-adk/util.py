@@ -21,6 +21,12 @@ flags.DEFINE_bool("create_session", False, "Creates a new session.")
 flags.DEFINE_bool("list_sessions", False, "Lists all sessions for a user.")
 flags.DEFINE_bool("get_session", False, "Gets a specific session.")
 flags.DEFINE_bool("send", False, "Sends a message to the deployed agent.")
+flags.DEFINE_bool(
+    "dump_catalog", False, "Records the store catalog for the local catalog mirror."
+)
+flags.DEFINE_string(
+    "catalog_path", "catalog.json", "Path of the catalog dump to write."
+)
 flags.DEFINE_string(
     "message",
     "Shorten this message: Hello, how are you doing today?",
@@ -36,6 +42,7 @@ flags.mark_bool_flags_as_mutual_exclusive(
         "list_sessions",
         "get_session",
         "send",
+        "dump_catalog",
     ]
 )
 
@@ -61,6 +68,7 @@ def create() -> None:
             "python-dotenv",
             "cloudpickle",
             "pydantic",
+            "httpx",
         ],
         env_vars=["SHOPIFY_ADMIN_TOKEN", "SHOPIFY_DOMAIN"],
         extra_packages=["./happy_shopper"],
@@ -162,6 +170,20 @@ def send_message(resource_id: str, user_id: str, session_id: str, message: str)
         print(event)
 
 
+def dump_catalog(path: str) -> None:
+    """Records the store catalog from the Admin API to a JSON dump."""
+    import asyncio
+
+    from happy_shopper.catalog import CatalogMirror, sync
+    from happy_shopper.shopify import admin_client
+
+    mirror = CatalogMirror()
+    asyncio.run(
+        sync(mirror, admin_client(), os.getenv("SHOPIFY_DOMAIN", ""), full=True)
+    )
+    print(f"Dumped {mirror.export_dump(path)} products to {path}")
+
+
 def main(argv=None):
     """Main function that can be called directly or through app.run()."""
     # Parse flags first
@@ -172,6 +194,10 @@ def main(argv=None):
 
     load_dotenv()
 
+    if FLAGS.dump_catalog:
+        dump_catalog(FLAGS.catalog_path)
+        return
+
     # Now we can safely access the flags
     project_id = (
         FLAGS.project_id if FLAGS.project_id else os.getenv("GOOGLE_CLOUD_PROJECT")
@@ -235,7 +261,7 @@ def main(argv=None):
         send_message(FLAGS.resource_id, user_id, FLAGS.session_id, FLAGS.message)
     else:
         print(
-            "Please specify one of: --create, --delete, --list, --create_session, --list_sessions, --get_session, or --send"
+            "Please specify one of: --create, --delete, --list, --create_session, --list_sessions, --get_session, --send, or --dump_catalog"
         )
 
 
@@ -643,47 +643,90 @@
         }
       },
 
-      async oneShotResponseForAgent(agentUserId, agentSessionId, userMessage) {
-        const requestUrl = `${CONFIG.API_BASE_URL}/api/chat/${agentUserId}/${agentSessionId}/send-agent-message`;
+      async streamChatTurn(requestUrl, userMessage, handleEvent) {
+        // The same key on every attempt lets the server attach a retry to the run already in flight
+        const idempotencyKey = crypto.randomUUID();
+        const maxAttempts = 3;
 
-        try {
-          const response = await fetch(requestUrl, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              message: userMessage,
-            }),
-          });
+        let lastEventId = null;
 
-          const reader = response.body.getReader();
-          const decoder = new TextDecoder("utf-8");
+        for (let attempt = 1; ; attempt++) {
+          const headers = {
+            "Content-Type": "application/json",
+            "Idempotency-Key": idempotencyKey,
+          };
 
-          let buffer = "";
+          if (lastEventId) {
+            headers["Last-Event-ID"] = lastEventId;
+          }
 
-          while (true) {
-            const { done, value } = await reader.read();
+          try {
+            const response = await fetch(requestUrl, {
+              method: "POST",
+              headers,
+              body: JSON.stringify({
+                message: userMessage,
+              }),
+            });
 
-            if (done) {
-              break;
+            if (!response.ok) {
+              throw new Error(`Chat request failed with ${response.status}`);
             }
 
-            buffer += decoder.decode(value, { stream: true });
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder("utf-8");
+
+            let buffer = "";
+
+            while (true) {
+              const { done, value } = await reader.read();
 
-            const lines = buffer.split("\n\n");
+              if (done) {
+                return;
+              }
+
+              buffer += decoder.decode(value, { stream: true });
+
+              const blocks = buffer.split("\n\n");
 
-            for (let i = 0; i < lines.length - 1; i++) {
-              const line = lines[i].trim();
+              for (let i = 0; i < blocks.length - 1; i++) {
+                let eventType = null;
+                let rawEvent = null;
 
-              if (line.startsWith("data:")) {
-                const rawEvent = line.replace(/^data:\s*/, "");
-                const parsedEvent = JSON.parse(rawEvent);
+                for (const line of blocks[i].trim().split("\n")) {
+                  if (line.startsWith("id:")) {
+                    lastEventId = line.replace(/^id:\s*/, "");
+                  } else if (line.startsWith("event:")) {
+                    eventType = line.replace(/^event:\s*/, "");
+                  } else if (line.startsWith("data:")) {
+                    rawEvent = line.replace(/^data:\s*/, "");
+                  }
+                }
 
-                this.handleResponseEventForAgent(parsedEvent);
+                // Typed frames (output, tool-call, ...) only come with the final-only profile
+                if (rawEvent && !eventType) {
+                  handleEvent(JSON.parse(rawEvent));
+                }
               }
-            }
 
-            buffer = lines[lines.length - 1];
+              buffer = blocks[blocks.length - 1];
+            }
+          } catch (error) {
+            // Only network drops are retried; the server resumes after lastEventId
+            if (!(error instanceof TypeError) || attempt >= maxAttempts) {
+              throw error;
+            }
           }
+        }
+      },
+
+      async oneShotResponseForAgent(agentUserId, agentSessionId, userMessage) {
+        const requestUrl = `${CONFIG.API_BASE_URL}/api/chat/${agentUserId}/${agentSessionId}/send-agent-message?profile=ui`;
+
+        try {
+          await this.streamChatTurn(requestUrl, userMessage, (event) =>
+            this.handleResponseEventForAgent(event),
+          );
 
           ShopifyAgent.UI.removeTypingIndicator();
         } catch (error) {
@@ -709,7 +752,11 @@
             );
           }
 
-          if (part.function_response?.name === "search_shop_catalog") {
+          // Both catalog search tools answer in the MCP tool result envelope
+          if (
+            part.function_response?.name === "search_shop_catalog" ||
+            part.function_response?.name === "search_local_catalog"
+          ) {
             try {
               const productContent =
                 part.function_response.response.content[0].text;
@@ -735,7 +782,7 @@
               }
             } catch (error) {
               console.error(
-                "Something went wrong in API.handleResponseEventForAgent (search_shop_catalog): ",
+                `Something went wrong in API.handleResponseEventForAgent (${part.function_response.name}): `,
                 error,
               );
             }
@@ -858,46 +905,12 @@
         advisorSessionId,
         userMessage,
       ) {
-        const requestUrl = `${CONFIG.API_BASE_URL}/api/chat/${agentUserId}/${advisorSessionId}/send-advisor-message`;
+        const requestUrl = `${CONFIG.API_BASE_URL}/api/chat/${agentUserId}/${advisorSessionId}/send-advisor-message?profile=ui`;
 
         try {
-          const response = await fetch(requestUrl, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              message: userMessage,
-            }),
-          });
-
-          const reader = response.body.getReader();
-          const decoder = new TextDecoder("utf-8");
-
-          let buffer = "";
-
-          while (true) {
-            const { done, value } = await reader.read();
-
-            if (done) {
-              break;
-            }
-
-            buffer += decoder.decode(value, { stream: true });
-
-            const lines = buffer.split("\n\n");
-
-            for (let i = 0; i < lines.length - 1; i++) {
-              const line = lines[i].trim();
-
-              if (line.startsWith("data:")) {
-                const rawEvent = line.replace(/^data:\s*/, "");
-                const parsedEvent = JSON.parse(rawEvent);
-
-                this.handleResponseEventForAdvisor(parsedEvent);
-              }
-            }
-
-            buffer = lines[lines.length - 1];
-          }
+          await this.streamChatTurn(requestUrl, userMessage, (event) =>
+            this.handleResponseEventForAdvisor(event),
+          );
         } catch (error) {
           console.error(
             "Something went wrong in API.oneShotResponseForAdvisor: ",